@@ -0,0 +1,186 @@
+"""
+Mide el tiempo y el pico de memoria de cada etapa del análisis sobre muestras
+sintéticas, a distintas escalas.
+
+Uso: python -m benchmarks.run --destinations 4 --samples 1000 --scales 1 2 4
+"""
+
+import json
+import os
+import tempfile
+import tracemalloc
+from argparse import ArgumentParser
+from dataclasses import asdict, dataclass
+from time import perf_counter
+from typing import Any, Callable
+
+from benchmarks.synthetic import synthetic_coordinates, synthetic_destination_samples
+from figures.tabla_cantidad_respuestas import tabla_cantidad_respuestas
+from figures.tabla_ruta_promedio import tabla_ruta_promedio
+from geolocation.geolocation import get_point_clusters
+from stats import average_route, get_valid_segment_times_for_ttl
+from traceroute import RouteSamples, load_samples, save_samples
+
+
+@dataclass
+class StageResult:
+    stage: str
+    scale: int
+    seconds: float
+    peak_memory_bytes: int
+
+
+def measure(
+    stage: str, scale: int, f: Callable[[], Any], repeat: int = 3
+) -> StageResult:
+    """
+    Corre f repeat veces y se queda con el menor tiempo; después la corre una vez
+    más con tracemalloc para medir el pico de memoria (que así no afecta el tiempo).
+    """
+    seconds = float("inf")
+    for _ in range(repeat):
+        start = perf_counter()
+        f()
+        seconds = min(seconds, perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        f()
+        _, peak_memory_bytes = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return StageResult(stage, scale, seconds, peak_memory_bytes)
+
+
+def all_segment_times(samples: RouteSamples) -> list[list[float]]:
+    # Como en grafico_tiempo_enlace_para_cada_ttl, hasta el TTL que tienen todas
+    return [
+        get_valid_segment_times_for_ttl(samples, ttl)
+        for ttl in range(1, min(map(len, samples)))
+    ]
+
+
+def run_benchmarks(
+    *,
+    destinations: int,
+    samples: int,
+    hops: int,
+    loss_rate: float,
+    churn: float,
+    points: int,
+    scale: int,
+    repeat: int,
+) -> list[StageResult]:
+    destination_samples = synthetic_destination_samples(
+        destinations,
+        samples=samples * scale,
+        hops=hops,
+        loss_rate=loss_rate,
+        churn=churn,
+    )
+    coordinates = synthetic_coordinates(points * scale)
+
+    def segment_times_of_all_destinations() -> list[list[list[float]]]:
+        return [all_segment_times(s) for s in destination_samples.values()]
+
+    results = [
+        measure(
+            "average_route",
+            scale,
+            lambda: [average_route(s) for s in destination_samples.values()],
+            repeat,
+        ),
+        measure(
+            "get_valid_segment_times_for_ttl",
+            scale,
+            segment_times_of_all_destinations,
+            repeat,
+        ),
+        measure(
+            "tabla_cantidad_respuestas",
+            scale,
+            lambda: tabla_cantidad_respuestas(destination_samples),
+            repeat,
+        ),
+        measure(
+            "tabla_ruta_promedio",
+            scale,
+            lambda: [tabla_ruta_promedio(s) for s in destination_samples.values()],
+            repeat,
+        ),
+        measure(
+            "get_point_clusters",
+            scale,
+            lambda: get_point_clusters(coordinates),
+            repeat,
+        ),
+    ]
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = []
+        for destination, route_samples in destination_samples.items():
+            paths.append(os.path.join(directory, f"{destination}.samples"))
+            save_samples(route_samples, paths[-1])
+
+        results.append(
+            measure(
+                "load_samples",
+                scale,
+                lambda: [load_samples(path) for path in paths],
+                repeat,
+            )
+        )
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--destinations", type=int, default=4)
+    parser.add_argument("--samples", type=int, default=256, help="Rutas por destino")
+    parser.add_argument("--hops", type=int, default=16, help="Saltos por ruta")
+    parser.add_argument(
+        "--loss-rate", type=float, default=0.1, help="Proporción de NoResponse"
+    )
+    parser.add_argument(
+        "--churn", type=float, default=0.05, help="Probabilidad de cambiar de camino"
+    )
+    parser.add_argument(
+        "--points", type=int, default=10000, help="Puntos para get_point_clusters"
+    )
+    parser.add_argument(
+        "--scales",
+        type=int,
+        nargs="+",
+        default=[1],
+        help="Multiplicadores de --samples y --points",
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--output", type=str, default=None, help="Path a un JSON con los resultados"
+    )
+    args = parser.parse_args()
+
+    results: list[StageResult] = []
+    print(f"{'Etapa':32} {'Escala':>6} {'Tiempo (s)':>12} {'Memoria (MiB)':>14}")
+    for scale in args.scales:
+        for result in run_benchmarks(
+            destinations=args.destinations,
+            samples=args.samples,
+            hops=args.hops,
+            loss_rate=args.loss_rate,
+            churn=args.churn,
+            points=args.points,
+            scale=scale,
+            repeat=args.repeat,
+        ):
+            results.append(result)
+            print(
+                f"{result.stage:32} {result.scale:6} {result.seconds:12.4f}"
+                f" {result.peak_memory_bytes / 2**20:14.2f}"
+            )
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump([asdict(result) for result in results], f, indent=2)
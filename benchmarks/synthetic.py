@@ -0,0 +1,142 @@
+"""
+Generación de muestras sintéticas para los benchmarks, con la misma forma que las
+que produce sample_routes.
+"""
+
+import random
+
+from geolocation.api import WorldCoordinates
+from traceroute import IPAddress, NoResponse, RouterResponse, RouteSamples, TTLRoute
+
+LOCALHOST = "127.0.0.1"
+
+
+def synthetic_route(
+    dst_ip: IPAddress,
+    path: list[IPAddress],
+    alternatives: list[IPAddress],
+    link_times: list[float],
+    *,
+    loss_rate: float,
+    churn: float,
+    rng: random.Random,
+) -> TTLRoute:
+    """
+    Una ruta que sigue path, pero en cada salto con probabilidad churn pasa por la
+    IP alternativa de ese salto, y con probabilidad churn agrega un salto extra.
+    Los routers intermedios no responden con probabilidad loss_rate.
+    """
+    hops = [
+        alternative if rng.random() < churn else ip
+        for ip, alternative in zip(path, alternatives)
+    ]
+    times = list(link_times)
+    if rng.random() < churn:
+        extra = rng.randrange(len(hops))
+        hops.insert(extra, alternatives[extra])
+        times.insert(extra, link_times[extra])
+    hops.append(dst_ip)
+    times.append(link_times[-1])
+
+    route: TTLRoute = [RouterResponse(ttl=0, ip=LOCALHOST, segment_time=0, rtt_time=0)]
+    rtt = 0.0
+    last_rtt = 0.0
+
+    for ttl, (ip, link_time) in enumerate(zip(hops, times), start=1):
+        rtt += link_time
+        if ip != dst_ip and rng.random() < loss_rate:
+            route.append(NoResponse(ttl=ttl))
+            continue
+
+        # Ruido como el de las mediciones reales, que a veces da diferencias negativas
+        measured_rtt = rtt * rng.lognormvariate(0, 0.1)
+        rtt_diff = measured_rtt - last_rtt
+        if rtt_diff > 0:
+            last_rtt = measured_rtt
+
+        route.append(
+            RouterResponse(ttl=ttl, ip=ip, segment_time=rtt_diff, rtt_time=measured_rtt)
+        )
+
+    return route
+
+
+def synthetic_route_samples(
+    destination: int = 0,
+    *,
+    samples: int = 32,
+    hops: int = 16,
+    loss_rate: float = 0.1,
+    churn: float = 0.05,
+    seed: int = 0,
+) -> RouteSamples:
+    """
+    samples rutas hacia un destino con hops saltos intermedios.
+
+    Las IPs salen de 10.0.0.0/8 y de 100.64.0.0/10, así que son distintas para
+    cada destino.
+    """
+    rng = random.Random(f"{seed}-{destination}")
+
+    dst_ip = f"198.18.{destination // 256}.{destination % 256}"
+    path = [f"10.{destination % 256}.{destination // 256}.{hop}" for hop in range(hops)]
+    alternatives = [
+        f"100.{64 + destination % 64}.{destination // 64 % 256}.{hop}"
+        for hop in range(hops)
+    ]
+    link_times = [rng.expovariate(1 / 0.005) for _ in range(hops + 1)]
+
+    return [
+        synthetic_route(
+            dst_ip,
+            path,
+            alternatives,
+            link_times,
+            loss_rate=loss_rate,
+            churn=churn,
+            rng=rng,
+        )
+        for _ in range(samples)
+    ]
+
+
+def synthetic_destination_samples(
+    destinations: int = 4,
+    *,
+    samples: int = 32,
+    hops: int = 16,
+    loss_rate: float = 0.1,
+    churn: float = 0.05,
+    seed: int = 0,
+) -> dict[str, RouteSamples]:
+    return {
+        f"destino{destination}": synthetic_route_samples(
+            destination,
+            samples=samples,
+            hops=hops,
+            loss_rate=loss_rate,
+            churn=churn,
+            seed=seed,
+        )
+        for destination in range(destinations)
+    }
+
+
+def synthetic_coordinates(points: int, *, seed: int = 0) -> list[WorldCoordinates]:
+    """
+    Puntos agrupados alrededor de algunas ciudades, como los de una ruta
+    geolocalizada.
+    """
+    rng = random.Random(seed)
+    cities = [(rng.uniform(-60, 60), rng.uniform(-180, 180)) for _ in range(32)]
+
+    coordinates = []
+    for _ in range(points):
+        latitude, longitude = rng.choice(cities)
+        coordinates.append(
+            WorldCoordinates(
+                latitude=latitude + rng.gauss(0, 1),
+                longitude=longitude + rng.gauss(0, 1),
+            )
+        )
+    return coordinates
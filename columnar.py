@@ -0,0 +1,208 @@
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Iterable
+
+import numpy as np
+
+from traceroute import IPAddress, NoResponse, RouterResponse, TTLRoute
+
+
+@dataclass(frozen=True)
+class ColumnarSamples:
+    """
+    Las mismas rutas que un RouteSamples, pero guardadas por columnas.
+
+    Todas las matrices tienen forma (muestras, TTLs). Las rutas más cortas que la
+    más larga se completan como si no hubieran respondido. Las IPs se guardan como
+    índices en ips, y -1 indica que no hubo respuesta.
+    """
+
+    rtt_time: np.ndarray
+    segment_time: np.ndarray
+    responded: np.ndarray
+    ip_ids: np.ndarray
+    lengths: np.ndarray
+    ips: list[IPAddress]
+
+    @staticmethod
+    def from_samples(route_samples: Iterable[TTLRoute]) -> "ColumnarSamples":
+        ip_to_id: dict[IPAddress, int] = {}
+        lengths: list[int] = []
+        rtt_times: list[float] = []
+        segment_times: list[float] = []
+        ip_ids: list[int] = []
+
+        for route in route_samples:
+            lengths.append(len(route))
+            for response in route:
+                if isinstance(response, RouterResponse):
+                    rtt_times.append(response.rtt_time)
+                    segment_times.append(response.segment_time)
+                    ip_ids.append(ip_to_id.setdefault(response.ip, len(ip_to_id)))
+                else:
+                    rtt_times.append(0.0)
+                    segment_times.append(0.0)
+                    ip_ids.append(-1)
+
+        # Posición (fila, columna) de cada respuesta en las matrices
+        route_lengths = np.array(lengths, dtype=np.int32)
+        rows = np.repeat(np.arange(len(lengths)), route_lengths)
+        columns = np.arange(len(ip_ids)) - np.repeat(
+            np.cumsum(route_lengths) - route_lengths, route_lengths
+        )
+        shape = (len(lengths), int(route_lengths.max(initial=0)))
+
+        def to_matrix(values: list[Any], fill: Any, dtype: type) -> np.ndarray:
+            matrix: np.ndarray = np.full(shape, fill, dtype=dtype)
+            matrix[rows, columns] = values
+            return matrix
+
+        ip_id_matrix = to_matrix(ip_ids, -1, np.int32)
+
+        return ColumnarSamples(
+            rtt_time=to_matrix(rtt_times, 0.0, np.float64),
+            segment_time=to_matrix(segment_times, 0.0, np.float64),
+            responded=ip_id_matrix >= 0,
+            ip_ids=ip_id_matrix,
+            lengths=route_lengths,
+            ips=list(ip_to_id),
+        )
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+    def select(self, rows: np.ndarray) -> "ColumnarSamples":
+        """Retorna sólo las rutas indicadas por rows (máscara o índices)."""
+        return ColumnarSamples(
+            rtt_time=self.rtt_time[rows],
+            segment_time=self.segment_time[rows],
+            responded=self.responded[rows],
+            ip_ids=self.ip_ids[rows],
+            lengths=self.lengths[rows],
+            ips=self.ips,
+        )
+
+    def reached_destination(self) -> np.ndarray:
+        """Retorna qué rutas terminan en una respuesta (y no en un NoResponse)."""
+        return self.responded[np.arange(len(self)), self.lengths - 1]
+
+
+def router_response_count(samples: ColumnarSamples) -> np.ndarray:
+    """
+    Retorna la longitud de cada ruta sin contar los NoResponse.
+    """
+    return samples.responded.sum(axis=1)
+
+
+def number_no_responses(samples: ColumnarSamples) -> np.ndarray:
+    """
+    Retorna la cantidad de NoResponse de cada ruta.
+    """
+    return samples.lengths - router_response_count(samples)
+
+
+def average_length(samples: ColumnarSamples) -> float:
+    """
+    Retorna el largo promedio de las rutas (sin contar los NoResponse).
+    """
+    return float(router_response_count(samples).mean())
+
+
+def number_of_negative_ttls(samples: ColumnarSamples) -> np.ndarray:
+    """
+    Devuelve la cantidad de TTLs negativos de cada ruta.
+    """
+    return (samples.responded & (samples.segment_time == 0)).sum(axis=1)
+
+
+def get_valid_segment_times_for_ttl(samples: ColumnarSamples, ttl: int) -> np.ndarray:
+    """
+    Devuelve los RTT de los paquetes que llegaron al TTL dado.
+    """
+    segment_times = samples.segment_time[:, ttl]
+    return segment_times[segment_times > 0]
+
+
+def drop_localhost(samples: ColumnarSamples) -> ColumnarSamples:
+    """
+    Devuelve las rutas sin la primera respuesta, que corresponde al localhost.
+    """
+    first_ip_ids = samples.ip_ids[:, 0]
+    # Una respuesta que falta (-1) no es el localhost, como en stats.drop_localhost,
+    # y usada como índice leería la última IP de ips
+    assert (first_ip_ids >= 0).all()
+    assert all(samples.ips[ip_id].startswith("127") for ip_id in first_ip_ids)
+
+    return ColumnarSamples(
+        rtt_time=samples.rtt_time[:, 1:],
+        segment_time=samples.segment_time[:, 1:],
+        responded=samples.responded[:, 1:],
+        ip_ids=samples.ip_ids[:, 1:],
+        lengths=samples.lengths - 1,
+        ips=samples.ips,
+    )
+
+
+def most_common_ip_ids(samples: ColumnarSamples) -> np.ndarray:
+    """
+    Devuelve el id de la IP más frecuente en cada TTL, o -1 si nadie respondió.
+
+    Los empates se desempatan igual que Counter.most_common: gana la IP que
+    aparece primero en ese TTL.
+    """
+    number_of_samples, number_of_ttls = samples.ip_ids.shape
+    number_of_ips = len(samples.ips)
+
+    ttls = np.broadcast_to(np.arange(number_of_ttls), samples.ip_ids.shape)
+    rows = np.broadcast_to(np.arange(number_of_samples)[:, None], samples.ip_ids.shape)
+    ttls, rows = ttls[samples.responded], rows[samples.responded]
+    cells = ttls * number_of_ips + samples.ip_ids[samples.responded]
+
+    counts = np.bincount(cells, minlength=number_of_ttls * number_of_ips).reshape(
+        number_of_ttls, number_of_ips
+    )
+
+    first_seen = np.full(number_of_ttls * number_of_ips, number_of_samples)
+    np.minimum.at(first_seen, cells, rows)
+    first_seen = first_seen.reshape(number_of_ttls, number_of_ips)
+
+    is_most_common = counts == counts.max(axis=1, initial=0, keepdims=True)
+    modes = np.where(is_most_common, first_seen, number_of_samples).argmin(axis=1)
+
+    return np.where(counts.max(axis=1, initial=0) > 0, modes, -1)
+
+
+def average_route(samples: ColumnarSamples) -> TTLRoute:
+    """
+    Igual que stats.average_route, pero calculada sobre todas las columnas a la vez.
+    """
+    most_common_length, _ = Counter(
+        samples.lengths[samples.reached_destination()].tolist()
+    ).most_common(1)[0]
+
+    # Nos quedamos solo con las rutas de la misma distancia
+    samples = samples.select(samples.lengths == most_common_length)
+    modes = most_common_ip_ids(samples)[:most_common_length]
+
+    with_mode = samples.ip_ids[:, :most_common_length] == modes
+    num_pkts_with_ip = with_mode.sum(axis=0)
+    average_segment_times = np.where(
+        with_mode, samples.segment_time[:, :most_common_length], 0
+    ).sum(axis=0) / np.maximum(num_pkts_with_ip, 1)
+    average_rtt_times = np.where(
+        with_mode, samples.rtt_time[:, :most_common_length], 0
+    ).sum(axis=0) / np.maximum(num_pkts_with_ip, 1)
+
+    return [
+        (
+            RouterResponse(
+                ttl=ttl,
+                ip=samples.ips[modes[ttl]],
+                segment_time=float(average_segment_times[ttl]),
+                rtt_time=float(average_rtt_times[ttl]),
+            )
+            if modes[ttl] >= 0
+            else NoResponse(ttl=ttl)
+        )
+        for ttl in range(most_common_length)
+    ]
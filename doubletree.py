@@ -0,0 +1,272 @@
+"""
+Trazas al estilo Doubletree: no se vuelven a medir los saltos que ya se conocen.
+
+Muchos destinos comparten los primeros saltos (el router de la casa y después el
+ISP), así que en vez de empezar cada traza en TTL 1 se empieza en un TTL del medio,
+se avanza hasta el destino, y después se retrocede sólo hasta encontrar un
+(TTL, IP) que ya esté en el stop set. El resto de la ruta se completa con lo que
+se midió la última vez que se pasó por ese salto.
+"""
+
+import random
+from typing import Iterable, Iterator, Mapping
+
+from tqdm import tqdm
+
+from probing import Prober
+from traceroute import (
+    MAX_TTL,
+    SAMPLES_PER_TTL,
+    IPAddress,
+    RouteSamples,
+    RouterResponse,
+    SampleWriter,
+    TTLRoute,
+    multi_destination_echo_requests,
+    route_from_replies,
+)
+
+Reply = tuple[int, IPAddress | None, float]
+
+
+class DoubletreeTracer:
+    """
+    Hace trazas compartiendo un stop set de (TTL, IP) entre todas ellas.
+
+    Para cada (TTL, IP) del stop set se guardan las respuestas de los TTLs
+    anteriores de la última traza que pasó por ahí. Los saltos que se completan
+    desde el stop set tienen los RTTs de esa traza, no de la actual.
+
+    Las trazas de varios destinos se hacen a la vez, como en sample_many_routes:
+    cada paso (una ventana hacia adelante o un TTL hacia atrás) se envía para
+    todos los destinos en una sola tanda, así que cuesta un timeout y no uno por
+    destino.
+    """
+
+    def __init__(
+        self,
+        *,
+        start_ttl: int = 5,
+        window: int = 8,
+        max_ttl: int = MAX_TTL,
+        timeout: float = 1,
+        prober: Prober | None = None,
+    ) -> None:
+        self.start_ttl = start_ttl
+        self.window = window
+        self.max_ttl = max_ttl
+        self.timeout = timeout
+        self.prober = prober
+
+        self.stop_set: dict[tuple[int, IPAddress], tuple[Reply, ...]] = {}
+        self.probes_sent = 0
+        # Ids de ICMP para scapy, nuevos en cada tanda
+        self.next_id = random.randrange(2**16)
+
+    def probe(
+        self, ttls: Mapping[IPAddress, list[int]]
+    ) -> dict[IPAddress, dict[int, Reply]]:
+        self.probes_sent += sum(map(len, ttls.values()))
+        first_id = self.next_id
+        self.next_id = (self.next_id + len(ttls)) % 2**16
+
+        replies = multi_destination_echo_requests(
+            ttls, first_id=first_id, timeout=self.timeout, prober=self.prober
+        )
+        return {
+            dst_ip: {
+                ttl: (
+                    (ttl, *replies[dst_ip][ttl])
+                    if ttl in replies[dst_ip]
+                    else (ttl, None, 0.0)
+                )
+                for ttl in dst_ttls
+            }
+            for dst_ip, dst_ttls in ttls.items()
+        }
+
+    def probe_forward(
+        self, dst_ips: list[IPAddress]
+    ) -> dict[IPAddress, dict[int, Reply]]:
+        """
+        Mide desde start_ttl en ventanas de window TTLs en paralelo, hasta que
+        responde cada destino.
+        """
+        replies: dict[IPAddress, dict[int, Reply]] = {dst_ip: {} for dst_ip in dst_ips}
+        pending = dst_ips
+
+        for first_ttl in range(self.start_ttl, self.max_ttl + 1, self.window):
+            if not pending:
+                break
+            ttls = list(
+                range(first_ttl, min(first_ttl + self.window, self.max_ttl + 1))
+            )
+            for dst_ip, dst_replies in self.probe(
+                {dst_ip: ttls for dst_ip in pending}
+            ).items():
+                replies[dst_ip].update(dst_replies)
+
+            pending = [
+                dst_ip
+                for dst_ip in pending
+                if not any(ip == dst_ip for _, ip, _ in replies[dst_ip].values())
+            ]
+
+        return replies
+
+    def probe_backward(
+        self, dst_ips: list[IPAddress]
+    ) -> dict[IPAddress, dict[int, Reply]]:
+        """
+        Mide de a un TTL hacia atrás desde start_ttl - 1, hasta que cada destino
+        llega a un salto del stop set o a uno al que llegó otro destino en este
+        mismo paso, y completa los TTLs anteriores con lo de ese salto. De los
+        destinos que comparten un salto nuevo sólo sigue midiendo uno.
+        """
+        replies: dict[IPAddress, dict[int, Reply]] = {dst_ip: {} for dst_ip in dst_ips}
+        # El salto en el que se cortó cada destino
+        joined: dict[IPAddress, tuple[int, IPAddress]] = {}
+        # El destino que siguió midiendo desde cada salto nuevo
+        followed: dict[tuple[int, IPAddress], IPAddress] = {}
+        pending = dst_ips
+
+        for ttl in range(self.start_ttl - 1, 0, -1):
+            if not pending:
+                break
+            probed = self.probe({dst_ip: [ttl] for dst_ip in pending})
+
+            still_pending = []
+            for dst_ip in pending:
+                replies[dst_ip][ttl] = reply = probed[dst_ip][ttl]
+                ip = reply[1]
+                if ip is not None and (
+                    (ttl, ip) in self.stop_set or (ttl, ip) in followed
+                ):
+                    joined[dst_ip] = (ttl, ip)
+                    continue
+                if ip is not None:
+                    followed[(ttl, ip)] = dst_ip
+                still_pending.append(dst_ip)
+            pending = still_pending
+
+        # Del corte más cercano al origen al más lejano, así el destino que siguió
+        # midiendo ya tiene completos los TTLs anteriores
+        for dst_ip, (ttl, ip) in sorted(joined.items(), key=lambda item: item[1][0]):
+            if (ttl, ip) in self.stop_set:
+                known_replies = self.stop_set[(ttl, ip)]
+            else:
+                followed_replies = replies[followed[(ttl, ip)]]
+                known_replies = tuple(followed_replies[t] for t in range(1, ttl))
+            for reply in known_replies:
+                replies[dst_ip][reply[0]] = reply
+
+        return replies
+
+    def trace_many(self, dst_ips: list[IPAddress]) -> dict[IPAddress, TTLRoute]:
+        """
+        Las rutas de los destinos que se alcanzaron. Las que no llegan al destino
+        se descartan.
+        """
+        replies = self.probe_forward(dst_ips)
+        for dst_ip, backward_replies in self.probe_backward(dst_ips).items():
+            replies[dst_ip].update(backward_replies)
+
+        routes: dict[IPAddress, TTLRoute] = {}
+        for dst_ip in dst_ips:
+            dst_replies = replies[dst_ip]
+            try:
+                route = route_from_replies(
+                    dst_ip, (dst_replies[ttl] for ttl in sorted(dst_replies))
+                )
+            except Exception as e:
+                tqdm.write(f"{dst_ip}: {e}")
+                continue
+            self.remember(route)
+            routes[dst_ip] = route
+
+        return routes
+
+    def remember(self, route: TTLRoute) -> None:
+        """Agrega los saltos de la ruta al stop set."""
+        known_replies = tuple(
+            (response.ttl, response.ip, response.rtt_time)
+            if isinstance(response, RouterResponse)
+            else (response.ttl, None, 0.0)
+            for response in route[1:]
+        )
+        for response in route[1:]:
+            if isinstance(response, RouterResponse):
+                self.stop_set[(response.ttl, response.ip)] = known_replies[
+                    : response.ttl - 1
+                ]
+
+
+def sample_many_routes_doubletree(
+    dst_ips: Iterable[IPAddress],
+    *,
+    samples_per_ttl: int = SAMPLES_PER_TTL,
+    start_ttl: int = 5,
+    max_ttl: int = MAX_TTL,
+    timeout: float = 1,
+    batch_size: int = 2**12,
+    outputs: Mapping[IPAddress, SampleWriter] = {},
+    prober: Prober | None = None,
+) -> dict[IPAddress, RouteSamples]:
+    """
+    Como sample_many_routes, pero con un DoubletreeTracer compartido entre todos
+    los destinos.
+
+    El stop set se vacía en cada ronda, así que cada prefijo se mide al menos una
+    vez por ronda: si no, todas las muestras de un destino tendrían los mismos
+    RTTs en los saltos compartidos, y su varianza sería cero.
+    """
+    dst_ips = list(dict.fromkeys(dst_ips))
+    routes: dict[IPAddress, RouteSamples] = {dst_ip: [] for dst_ip in dst_ips}
+
+    for dst_ip, route in iter_many_routes_doubletree(
+        dst_ips,
+        samples_per_ttl=samples_per_ttl,
+        start_ttl=start_ttl,
+        max_ttl=max_ttl,
+        timeout=timeout,
+        batch_size=batch_size,
+        outputs=outputs,
+        prober=prober,
+    ):
+        routes[dst_ip].append(route)
+
+    return routes
+
+
+def iter_many_routes_doubletree(
+    dst_ips: Iterable[IPAddress],
+    *,
+    samples_per_ttl: int = SAMPLES_PER_TTL,
+    start_ttl: int = 5,
+    max_ttl: int = MAX_TTL,
+    timeout: float = 1,
+    batch_size: int = 2**12,
+    outputs: Mapping[IPAddress, SampleWriter] = {},
+    prober: Prober | None = None,
+) -> Iterator[tuple[IPAddress, TTLRoute]]:
+    """
+    Como sample_many_routes_doubletree, pero devuelve los pares (destino, ruta) a
+    medida que se miden, sin guardarlos en memoria.
+
+    Los destinos se trazan en tandas de a lo sumo batch_size paquetes por paso;
+    las tandas de una misma ronda comparten el stop set.
+    """
+    dst_ips = list(dict.fromkeys(dst_ips))
+    tracer = DoubletreeTracer(
+        start_ttl=start_ttl, max_ttl=max_ttl, timeout=timeout, prober=prober
+    )
+    destinations_per_batch = max(1, min(batch_size // tracer.window, 2**16 - 1))
+
+    for _ in tqdm(range(samples_per_ttl), desc="Midiendo rutas"):
+        tracer.stop_set.clear()
+        for start in range(0, len(dst_ips), destinations_per_batch):
+            batch = dst_ips[start : start + destinations_per_batch]
+            for dst_ip, route in tracer.trace_many(batch).items():
+                if dst_ip in outputs:
+                    outputs[dst_ip].write(route)
+                yield (dst_ip, route)
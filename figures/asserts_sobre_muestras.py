@@ -1,29 +1,31 @@
+from itertools import chain
+
 from figures.destinations import DestinationSamples
-from traceroute import RouterResponse
+from traceroute import IPAddress, RouterResponse
 
 
 def assert_all_samples_have_same_length(
     destination_samples: DestinationSamples,
 ) -> None:
-    assert all(
-        len(route) == len(destination_samples[destination][0])
-        for destination, samples in destination_samples.items()
-        for route in samples
-    )
+    for samples in destination_samples.values():
+        routes = iter(samples)
+        length = len(next(routes))
+        assert all(len(route) == length for route in routes)
 
 
 def assert_always_the_same_IP_for_each_TTL(
     destination_samples: DestinationSamples,
 ) -> None:
-    assert all(
-        len(
-            set(
-                response.ip
-                for route in samples
-                if isinstance(response := route[ttl - 1], RouterResponse)
-            )
-        )
-        <= 1
-        for samples in destination_samples.values()
-        for ttl in range(1, len(samples[0]))
-    )
+    for samples in destination_samples.values():
+        routes = iter(samples)
+        first_route = next(routes)
+        ips_by_ttl: dict[int, set[IPAddress]] = {
+            ttl: set() for ttl in range(1, len(first_route))
+        }
+
+        for route in chain([first_route], routes):
+            for ttl, ips in ips_by_ttl.items():
+                if isinstance(response := route[ttl - 1], RouterResponse):
+                    ips.add(response.ip)
+
+        assert all(len(ips) <= 1 for ips in ips_by_ttl.values())
@@ -1,14 +1,17 @@
-from traceroute import RouteSamples, load_samples
+from typing import Iterable, Mapping
 
+from traceroute import SamplesFile, TTLRoute
 
-DestinationSamples = dict[str, RouteSamples]
+
+# Cada destino se lee del archivo cada vez que se recorre, sin cargarlo en memoria
+DestinationSamples = Mapping[str, Iterable[TTLRoute]]
 
 
 def get_destination_samples() -> DestinationSamples:
     destinations = ["melbourne", "osaka", "oxford", "stanford"]
 
-    destination_samples: dict[str, RouteSamples] = {
-        destination: load_samples(f"samples/{destination}.samples")
+    destination_samples: dict[str, Iterable[TTLRoute]] = {
+        destination: SamplesFile(f"samples/{destination}.samples")
         for destination in destinations
     }
 
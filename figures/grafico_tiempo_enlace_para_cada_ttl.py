@@ -1,17 +1,22 @@
+from itertools import chain
+from typing import Iterable
+
 from matplotlib.axes import Axes
 import numpy as np
-from stats import get_valid_segment_times_for_ttl
-from traceroute import RouteSamples
+from stats import get_valid_segment_times_by_ttl
+from traceroute import TTLRoute
 
 
 def grafico_tiempo_enlace_para_cada_ttl(
-    destination: str, samples: RouteSamples, *, ax: Axes
+    destination: str, samples: Iterable[TTLRoute], *, ax: Axes
 ) -> None:
-    ttls = range(1, len(samples[0]))
+    routes = iter(samples)
+    first_route = next(routes)
+    ttls = range(1, len(first_route))
 
-    valid_segment_times = [
-        get_valid_segment_times_for_ttl(samples, ttl) for ttl in ttls
-    ]
+    valid_segment_times = get_valid_segment_times_by_ttl(
+        chain([first_route], routes), ttls
+    )
 
     # Esto solo tiene sentido cuando las rutas son iguales (o muy parecidas) entre sí
     # Por ejemplo, si una ruta tiene 1 salto más que las demás, va a generar outliers
@@ -1,10 +1,10 @@
 from typing import Any, Iterable, Mapping
-import pandas as pd
-import seaborn as sns
 
 
 def latex_figure_preamble() -> None:
     """Deja a matplotlib lista para generar figuras lindas en LaTeX."""
+    import seaborn as sns
+
     sns.set(
         rc={
             "text.usetex": True,
@@ -53,6 +53,8 @@ def latex_table(data: Mapping[str, Iterable[Any]]) -> str:
     Las claves de data son los nombres de las columnas, y los valores son las
     filas.
     """
+    import pandas as pd
+
     tabular = pd.DataFrame(
         data={
             latex_column_name(column_name): rows for column_name, rows in data.items()
@@ -1,4 +1,5 @@
-import numpy as np
+from typing import Iterable
+
 from figures.latex import (
     destination_2_latex,
     float_2_latex,
@@ -7,43 +8,55 @@ from figures.latex import (
     ratio_2_latex,
 )
 from figures.destinations import DestinationSamples, get_destination_samples
-from stats import drop_localhost, router_response_count
+from stats import router_response_count
+from traceroute import TTLRoute
+
+
+def cantidad_respuestas(samples: Iterable[TTLRoute]) -> tuple[float, int, float]:
+    """
+    Retorna la proporción promedio de respuestas, el largo de la primera ruta y la
+    cantidad promedio de respuestas, sin contar el localhost. Recorre las rutas
+    una sola vez.
+    """
+    ratio_sum = 0.0
+    count_sum = 0
+    first_length = None
+    number_of_routes = 0
+
+    for route in samples:
+        assert route[0].is_localhost()
+        route = route[1:]
+
+        if first_length is None:
+            first_length = len(route)
+        ratio_sum += router_response_count(route) / len(route)
+        count_sum += router_response_count(route)
+        number_of_routes += 1
+
+    assert first_length is not None, "No hay rutas"
+    return (
+        ratio_sum / number_of_routes,
+        first_length,
+        count_sum / number_of_routes,
+    )
 
 
 def tabla_cantidad_respuestas(destination_samples: DestinationSamples) -> str:
-    destination_samples = {
-        destination: drop_localhost(samples)
+    counts = {
+        destination: cantidad_respuestas(samples)
         for destination, samples in destination_samples.items()
     }
 
     return latex_table(
         {
-            "Destino": map(destination_2_latex, destination_samples.keys()),
-            "Proporción de Respuestas": map(
-                ratio_2_latex,
-                [
-                    float(
-                        np.mean(
-                            [
-                                router_response_count(route) / len(route)
-                                for route in samples
-                            ]
-                        )
-                    )
-                    for samples in destination_samples.values()
-                ],
-            ),
-            "Largo": map(
-                int_2_latex,
-                [len(samples[0]) for samples in destination_samples.values()],
-            ),
-            "Cantidad Promedio de Respuestas": map(
-                float_2_latex,
-                [
-                    float(np.mean([router_response_count(route) for route in samples]))
-                    for samples in destination_samples.values()
-                ],
-            ),
+            "Destino": map(destination_2_latex, counts.keys()),
+            "Proporción de Respuestas": [
+                ratio_2_latex(ratio) for ratio, _, _ in counts.values()
+            ],
+            "Largo": [int_2_latex(length) for _, length, _ in counts.values()],
+            "Cantidad Promedio de Respuestas": [
+                float_2_latex(count) for _, _, count in counts.values()
+            ],
         }
     )
 
@@ -0,0 +1,57 @@
+import math
+from typing import Iterable
+
+from figures.destinations import get_destination_samples
+from figures.latex import (
+    int_2_latex,
+    ip_2_latex,
+    latex_table,
+    seconds_2_latex,
+)
+from route_graph import EdgeStats, RouteGraph
+from stats import filter_only_responses
+from traceroute import TTLRoute
+
+
+def quantile_2_latex(edge: EdgeStats, q: float) -> str:
+    # Sin tiempos de enlace positivos el histograma está vacío
+    quantile = edge.histogram.quantile(q)
+    return "-" if math.isnan(quantile) else seconds_2_latex(quantile, in_ms=True)
+
+
+def tabla_enlaces(samples: Iterable[TTLRoute]) -> str:
+    """
+    Tabla con los enlaces de la ruta modal (la IP más frecuente de cada TTL):
+    cuántas rutas los atravesaron, la mediana y el percentil 90 de su tiempo de
+    enlace, y hacia cuántas IPs distintas sale cada salto (más de una es un
+    balanceador). Recorre las rutas una sola vez, armando un RouteGraph.
+    """
+    graph = RouteGraph.from_samples(samples)
+
+    path = filter_only_responses(graph.modal_path())[1:]  # Drop localhost
+    edges = [
+        (from_hop, to_hop, graph.edges[(from_hop.ip, to_hop.ip)])
+        for from_hop, to_hop in zip(path, path[1:])
+        if (from_hop.ip, to_hop.ip) in graph.edges
+    ]
+
+    return latex_table(
+        {
+            "TTL": [int_2_latex(to_hop.ttl) for _, to_hop, _ in edges],
+            "Desde": [ip_2_latex(from_hop.ip) for from_hop, _, _ in edges],
+            "Hasta": [ip_2_latex(to_hop.ip) for _, to_hop, _ in edges],
+            "Rutas": [int_2_latex(edge.count) for _, _, edge in edges],
+            "Mediana": [quantile_2_latex(edge, 0.5) for _, _, edge in edges],
+            "Percentil 90": [quantile_2_latex(edge, 0.9) for _, _, edge in edges],
+            "Salidas": [
+                int_2_latex(len(graph.successors(from_hop.ip)))
+                for from_hop, _, _ in edges
+            ],
+        }
+    )
+
+
+if __name__ == "__main__":
+    for destination, samples in get_destination_samples().items():
+        print(f"% {destination}")
+        print(tabla_enlaces(samples))
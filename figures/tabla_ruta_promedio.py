@@ -1,3 +1,5 @@
+from typing import Iterable
+
 from figures.latex import (
     int_2_latex,
     ip_2_latex,
@@ -5,11 +7,11 @@ from figures.latex import (
     seconds_2_latex,
 )
 from stats import average_route, filter_only_responses
-from traceroute import RouteSamples
+from traceroute import TTLRoute
 
 
 def tabla_ruta_promedio(
-    samples: RouteSamples,
+    samples: Iterable[TTLRoute],
 ) -> str:
     route = average_route(samples)
 
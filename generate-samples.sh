@@ -1,6 +1,8 @@
 #!/usr/bin/env bash
 
-sudo python traceroute.py 103.6.253.20 --output=samples/melbourne.samples &
-sudo python traceroute.py 192.76.7.115 --output=samples/oxford.samples &
-sudo python traceroute.py 204.63.224.5 --output=samples/stanford.samples &
-sudo python traceroute.py 192.50.0.5 --output=samples/osaka.samples
+sudo python sample_destinations.py \
+    melbourne=103.6.253.20 \
+    oxford=192.76.7.115 \
+    stanford=204.63.224.5 \
+    osaka=192.50.0.5 \
+    --output-dir=samples
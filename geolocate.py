@@ -6,26 +6,19 @@ Separé esto de lo demás porque python es un idiota con los imports
 from pprint import pprint
 from socket import inet_aton
 
-import geopandas as gpd
-import seaborn as sns
-from matplotlib import pyplot as plt
-
 from geolocation.api import GeolocationAPIClient, get_my_ip
 from geolocation.geolocation import geolocate_route, plot_route, plot_route_clusters
+from metrics import instrumented
 from stats import average_route
 from traceroute import (  # noqa: F401
     NoResponse,  # noqa: F401
     RouteResponse,  # noqa: F401
     RouterResponse,  # noqa: F401
-    load_samples,
+    iter_samples,
     sample_route_from_args,
     traceroute_parser,
 )
 
-sns.set(
-    rc={"text.usetex": True, "font.family": "serif", "font.serif": "Computer Modern"}
-)
-
 
 def is_valid_ip(ip: str) -> bool:
     try:
@@ -60,19 +53,31 @@ if __name__ == "__main__":
 
     args = traceroute_parser.parse_args()
 
-    if is_valid_ip(args.ip):
-        samples = sample_route_from_args(args)
-    else:  # Se asume que es un path
-        samples = load_samples(f"samples/{args.ip}.samples")
+    with instrumented(args.metrics, args.profile):
+        if is_valid_ip(args.ip):
+            route = average_route(sample_route_from_args(args))
+        else:  # Se asume que es un path
+            route = average_route(iter_samples(f"samples/{args.ip}.samples"))
 
-    route = average_route(samples)
+        pprint(route)
 
-    pprint(route)
+        with GeolocationAPIClient.get_client(args.api) as api_client:
+            route_coordinates = geolocate_route(route, api_client)
 
-    fig, ax = plt.subplots()
+    # Las bibliotecas para graficar se cargan recién cuando ya se tiene la ruta
+    import geopandas as gpd
+    import seaborn as sns
+    from matplotlib import pyplot as plt
 
-    api_client = GeolocationAPIClient.get_client(args.api)
-    route_coordinates = geolocate_route(route, api_client)
+    sns.set(
+        rc={
+            "text.usetex": True,
+            "font.family": "serif",
+            "font.serif": "Computer Modern",
+        }
+    )
+
+    fig, ax = plt.subplots()
 
     plot_route(route_coordinates, ax)
 
@@ -1,32 +1,75 @@
+import csv
 import json
 import os
+import socket
+import sqlite3
+import struct
 from abc import ABC, abstractmethod
+from bisect import bisect_right
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from dataclasses import dataclass
+from functools import cached_property
 from os import getcwd
 from os.path import dirname, realpath
 from pathlib import Path
-from typing import Any, Mapping, Type
+from threading import Lock
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Mapping, Type, TypeVar
 
-import dotenv
-import requests
-from geopy.distance import distance
+import numpy as np
 
+import metrics
+from geolocation.scheduler import RequestScheduler, is_rejected
 from traceroute import IPAddress
 
-# Cargo las API keys
-dotenv.load_dotenv()
+if TYPE_CHECKING:
+    import requests
 
 
 __location__ = realpath(Path(getcwd()) / dirname(__file__))
 
+# Se crea recién cuando un cliente necesita guardar algo
 CACHE_DIRECTORY = Path(__location__) / ".cache"
-if not CACHE_DIRECTORY.exists():
-    CACHE_DIRECTORY.mkdir()
+
+CACHE_HITS = metrics.counter("geolocation_cache_hits_total", "IPs que estaban en cache")
+CACHE_MISSES = metrics.counter(
+    "geolocation_cache_misses_total", "IPs que hubo que consultar"
+)
+UNCACHED_SECONDS = metrics.histogram(
+    "geolocation_uncached_seconds", "Tiempo en resolver los cache miss"
+)
+REQUEST_SECONDS = metrics.histogram(
+    "geolocation_request_seconds", "Duración de cada request HTTP a un proveedor"
+)
+
+
+def load_api_keys() -> None:
+    """Carga las API keys del .env, sólo cuando algún cliente las necesita."""
+    import dotenv
+
+    dotenv.load_dotenv()
+
+
+# Cantidad máxima de requests en vuelo al geolocalizar varias IPs a la vez
+MAX_CONCURRENT_REQUESTS = 16
+
+T = TypeVar("T")
+U = TypeVar("U")
+C = TypeVar("C", bound="GeolocationAPIClient")
+
+
+def map_concurrently(f: Callable[[T], U], items: Iterable[T]) -> list[U]:
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS) as pool:
+        return list(pool.map(f, items))
 
 
 def get_my_ip() -> IPAddress:
+    load_api_keys()
     if "MY_IP" in os.environ:
         return os.environ["MY_IP"]
+
+    import requests
+
     response = requests.get("https://api.ipify.org")
     response.raise_for_status()
     return response.text
@@ -38,6 +81,8 @@ class WorldCoordinates:
     longitude: float
 
     def distance_from(self, other: "WorldCoordinates") -> float:
+        from geopy.distance import distance
+
         return distance(
             (self.latitude, self.longitude), (other.latitude, other.longitude)
         ).km
@@ -46,6 +91,9 @@ class WorldCoordinates:
 class GeolocationAPIClient(ABC):
     clients: dict[str, Type["GeolocationAPIClient"]] = {}
 
+    # Sólo declarado: las subclases concretas lo definen y así se registran
+    name: str
+
     def __init_subclass__(cls) -> None:
         if hasattr(cls, "name"):  # Sólo las subclases concretas tienen nombre
             cls.clients[cls.name] = cls
@@ -53,18 +101,82 @@ class GeolocationAPIClient(ABC):
     @staticmethod
     def get_client(name: str, *args: Any, **kwargs: Any) -> "GeolocationAPIClient":
         """El mismísimo canHandle"""
+        load_api_keys()
         return GeolocationAPIClient.clients[name](*args, **kwargs)
 
     @abstractmethod
     def get_ip_location(self, ip: IPAddress) -> WorldCoordinates:
         ...
 
+    def get_ip_locations(
+        self, ips: Iterable[IPAddress]
+    ) -> dict[IPAddress, WorldCoordinates]:
+        """
+        Geolocaliza varias IPs, sin repetir. Por defecto hace los requests en
+        paralelo, de a una IP.
+        """
+        unique_ips = list(dict.fromkeys(ips))
+        return dict(zip(unique_ips, map_concurrently(self.get_ip_location, unique_ips)))
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self: C) -> C:
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        self.close()
+
 
 class JSONGeolocationAPIClient(GeolocationAPIClient):
+    # Cantidad máxima de IPs por request al endpoint bulk
+    bulk_size = 50
+
+    # Límites del proveedor, que hace respetar el RequestScheduler
+    requests_per_second: float = 8
+    daily_quota: int | None = None
+    monthly_quota: int | None = None
+
+    # Se pone en True si el proveedor rechaza el endpoint bulk (por ejemplo,
+    # porque es sólo para planes pagos), y se sigue de a una IP
+    bulk_rejected = False
+
     @abstractmethod
     def get_url(self, ip: IPAddress) -> str:
         ...
 
+    def get_bulk_url(self) -> str | None:
+        """
+        URL a la que se hace POST con {"ips": [...]} para geolocalizar varias IPs
+        en un solo request, o None si el proveedor no tiene endpoint bulk.
+        """
+        return None
+
+    @cached_property
+    def session(self) -> "requests.Session":
+        """Una sola sesión, para reusar las conexiones entre requests."""
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=MAX_CONCURRENT_REQUESTS,
+            pool_maxsize=MAX_CONCURRENT_REQUESTS,
+        )
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    @cached_property
+    def scheduler(self) -> RequestScheduler:
+        return RequestScheduler.for_provider(
+            getattr(self, "name", type(self).__name__),
+            self.requests_per_second,
+            quota_path=CACHE_DIRECTORY / "quota.sqlite3",
+            daily_quota=self.daily_quota,
+            monthly_quota=self.monthly_quota,
+        )
+
     def get_location_from_json_response(
         self, response: Mapping[str, Any]
     ) -> WorldCoordinates:
@@ -72,12 +184,72 @@ class JSONGeolocationAPIClient(GeolocationAPIClient):
             float(response["latitude"]), float(response["longitude"])
         )
 
-    def get_location_from_request(self, ip: IPAddress) -> WorldCoordinates:
-        response = requests.get(self.get_url(ip))
+    def fetch_location(self, ip: IPAddress) -> WorldCoordinates:
+        with REQUEST_SECONDS.time(provider=self.name, bulk=False):
+            response = self.session.get(self.get_url(ip))
         response.raise_for_status()
         data = response.json()
         return self.get_location_from_json_response(data)
 
+    def fetch_bulk_locations(
+        self, ips: list[IPAddress]
+    ) -> dict[IPAddress, WorldCoordinates]:
+        bulk_url = self.get_bulk_url()
+        assert bulk_url is not None, "El proveedor no tiene endpoint bulk"
+
+        with REQUEST_SECONDS.time(provider=self.name, bulk=True):
+            response = self.session.post(bulk_url, json={"ips": ips})
+        response.raise_for_status()
+        return {
+            entry["ip"]: self.get_location_from_json_response(entry)
+            for entry in response.json()
+        }
+
+    def get_location_from_request(self, ip: IPAddress) -> WorldCoordinates:
+        return self.scheduler.run(ip, lambda: self.fetch_location(ip))
+
+    def get_locations_from_bulk_request(
+        self, ips: list[IPAddress]
+    ) -> dict[IPAddress, WorldCoordinates]:
+        return self.scheduler.run_many(ips, self.fetch_bulk_locations)
+
+    def get_locations_from_requests(
+        self, ips: Iterable[IPAddress]
+    ) -> dict[IPAddress, WorldCoordinates]:
+        """
+        Geolocaliza varias IPs con requests en paralelo, usando el endpoint bulk
+        si el proveedor tiene uno y no lo rechazó (401 o 403).
+        """
+        import requests
+
+        unique_ips = list(dict.fromkeys(ips))
+
+        if self.get_bulk_url() is None or self.bulk_rejected:
+            return dict(
+                zip(
+                    unique_ips,
+                    map_concurrently(self.get_location_from_request, unique_ips),
+                )
+            )
+
+        locations: dict[IPAddress, WorldCoordinates] = {}
+        try:
+            for bulk_locations in map_concurrently(
+                self.get_locations_from_bulk_request,
+                [
+                    unique_ips[start : start + self.bulk_size]
+                    for start in range(0, len(unique_ips), self.bulk_size)
+                ],
+            ):
+                locations.update(bulk_locations)
+        except requests.HTTPError as error:
+            if not is_rejected(error):
+                raise
+            self.bulk_rejected = True
+            return self.get_locations_from_requests(unique_ips)
+
+        return locations
+
 
 class DazzlePodClient(JSONGeolocationAPIClient):
     name = "dazzlepod"
@@ -88,39 +260,161 @@ class DazzlePodClient(JSONGeolocationAPIClient):
     def get_ip_location(self, ip: IPAddress) -> WorldCoordinates:
         return self.get_location_from_request(ip)
 
+    def get_ip_locations(
+        self, ips: Iterable[IPAddress]
+    ) -> dict[IPAddress, WorldCoordinates]:
+        return self.get_locations_from_requests(ips)
+
+
+class GeolocationCache:
+    """
+    Cache persistente de ubicaciones, en una tabla de SQLite indexada por IP.
+
+    Cada miss agrega una sola fila, y SQLite se encarga de que varios procesos
+    (como los de generate-maps.sh) puedan usar el mismo archivo a la vez. Las
+    IPs usadas más recientemente se mantienen además en memoria.
+    """
+
+    def __init__(self, path: Path, hot_size: int = 2**16) -> None:
+        self.hot: OrderedDict[IPAddress, WorldCoordinates] = OrderedDict()
+        self.hot_size = hot_size
+        self.lock = Lock()
+
+        self.connection = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        with self.connection:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS locations "
+                "(ip TEXT PRIMARY KEY, latitude REAL, longitude REAL)"
+            )
+
+    def remember(self, ip: IPAddress, coordinates: WorldCoordinates) -> None:
+        self.hot[ip] = coordinates
+        self.hot.move_to_end(ip)
+        if len(self.hot) > self.hot_size:
+            self.hot.popitem(last=False)
+
+    def get_many(self, ips: list[IPAddress]) -> dict[IPAddress, WorldCoordinates]:
+        """Retorna las ubicaciones de las IPs que están en el cache."""
+        found: dict[IPAddress, WorldCoordinates] = {}
+
+        with self.lock:
+            cold_ips = []
+            for ip in ips:
+                if ip in self.hot:
+                    self.hot.move_to_end(ip)
+                    found[ip] = self.hot[ip]
+                else:
+                    cold_ips.append(ip)
+
+            # SQLite limita la cantidad de parámetros por query
+            for start in range(0, len(cold_ips), 500):
+                chunk = cold_ips[start : start + 500]
+                rows = self.connection.execute(
+                    "SELECT ip, latitude, longitude FROM locations "
+                    f"WHERE ip IN ({', '.join('?' * len(chunk))})",
+                    chunk,
+                )
+                for ip, latitude, longitude in rows:
+                    found[ip] = WorldCoordinates(latitude, longitude)
+                    self.remember(ip, found[ip])
+
+        return found
+
+    def get(self, ip: IPAddress) -> WorldCoordinates | None:
+        return self.get_many([ip]).get(ip)
+
+    def put_many(self, locations: Mapping[IPAddress, WorldCoordinates]) -> None:
+        with self.lock:
+            with self.connection:
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO locations VALUES (?, ?, ?)",
+                    [
+                        (ip, coordinates.latitude, coordinates.longitude)
+                        for ip, coordinates in locations.items()
+                    ],
+                )
+            for ip, coordinates in locations.items():
+                self.remember(ip, coordinates)
+
+    def put(self, ip: IPAddress, coordinates: WorldCoordinates) -> None:
+        self.put_many({ip: coordinates})
+
+    def import_json(self, path: Path) -> None:
+        """Carga un cache del formato viejo ({ip: [latitud, longitud]})."""
+        with open(path, "r") as cache_file:
+            self.put_many(
+                {
+                    ip: WorldCoordinates(latitude, longitude)
+                    for ip, (latitude, longitude) in json.load(cache_file).items()
+                }
+            )
+
 
 class CachedGeolocationAPIClient(GeolocationAPIClient):
     def __init__(self) -> None:
-        if not self.get_cache_path().exists():
-            self.cache = {}
-            self.save_cache()
-        else:
-            with open(self.get_cache_path(), "r") as cache_file:
-                self.cache = json.load(cache_file)
+        CACHE_DIRECTORY.mkdir(exist_ok=True)
+        self.cache = GeolocationCache(self.get_cache_path())
+
+        # Migro el cache viejo, que reescribía un JSON entero en cada miss. Varios
+        # procesos pueden intentarlo a la vez: importar dos veces no cambia nada,
+        # y si el archivo ya no está es porque otro proceso lo migró.
+        legacy_cache_path = self.get_cache_path().with_suffix(".json")
+        try:
+            self.cache.import_json(legacy_cache_path)
+            legacy_cache_path.rename(legacy_cache_path.with_suffix(".json.migrated"))
+        except FileNotFoundError:
+            pass
 
     @classmethod
     def get_cache_path(cls) -> Path:
         assert hasattr(cls, "name")
-        return CACHE_DIRECTORY / f"{cls.name}.json"
-
-    def save_cache(self) -> None:
-        with open(self.get_cache_path(), "w") as cache_file:
-            json.dump(self.cache, cache_file)
+        return CACHE_DIRECTORY / f"{cls.name}.sqlite3"
 
     def get_ip_location(self, ip: IPAddress) -> WorldCoordinates:
-        if ip not in self.cache:
+        coordinates = self.cache.get(ip)
+        if coordinates is None:
+            CACHE_MISSES.inc(provider=self.name)
             if os.environ.get("DEBUG"):
                 print(f"Cache miss para {ip}")
-            coordinates = self.get_uncached_ip_location(ip)
-            self.cache[ip] = [coordinates.latitude, coordinates.longitude]
-            self.save_cache()
-        latitude, longitude = self.cache[ip]
-        return WorldCoordinates(latitude, longitude)
+            with UNCACHED_SECONDS.time(provider=self.name):
+                coordinates = self.get_uncached_ip_location(ip)
+            self.cache.put(ip, coordinates)
+        else:
+            CACHE_HITS.inc(provider=self.name)
+        return coordinates
+
+    def get_ip_locations(
+        self, ips: Iterable[IPAddress]
+    ) -> dict[IPAddress, WorldCoordinates]:
+        """
+        Resuelve todos los cache miss juntos y los guarda en una sola transacción.
+        """
+        unique_ips = list(dict.fromkeys(ips))
+        locations = self.cache.get_many(unique_ips)
+        misses = [ip for ip in unique_ips if ip not in locations]
+        CACHE_HITS.inc(len(locations), provider=self.name)
+        CACHE_MISSES.inc(len(misses), provider=self.name)
+
+        if misses:
+            if os.environ.get("DEBUG"):
+                print(f"Cache miss para {', '.join(misses)}")
+            with UNCACHED_SECONDS.time(provider=self.name):
+                uncached_locations = self.get_uncached_ip_locations(misses)
+            self.cache.put_many(uncached_locations)
+            locations.update(uncached_locations)
+
+        return {ip: locations[ip] for ip in unique_ips}
 
     @abstractmethod
     def get_uncached_ip_location(self, ip: IPAddress) -> WorldCoordinates:
         ...
 
+    def get_uncached_ip_locations(
+        self, ips: list[IPAddress]
+    ) -> dict[IPAddress, WorldCoordinates]:
+        return dict(zip(ips, map_concurrently(self.get_uncached_ip_location, ips)))
+
 
 # Cuidado con la multiple inheritance!!!
 class IPGeolocationIOClient(CachedGeolocationAPIClient, JSONGeolocationAPIClient):
@@ -131,14 +425,244 @@ class IPGeolocationIOClient(CachedGeolocationAPIClient, JSONGeolocationAPIClient
     """
 
     name = "ipgeolocationio"
+    daily_quota: int | None = 1000
+    monthly_quota: int | None = 30000
 
-    def __init__(self, api_key: str = os.environ["IPGEOLOCATIONIO_KEY"]) -> None:
+    def __init__(self, api_key: str | None = None) -> None:
         CachedGeolocationAPIClient.__init__(self)
         JSONGeolocationAPIClient.__init__(self)
+        if api_key is None:
+            load_api_keys()
+            api_key = os.environ["IPGEOLOCATIONIO_KEY"]
         self.api_key = api_key
 
     def get_url(self, ip: IPAddress) -> str:
         return f"https://api.ipgeolocation.io/ipgeo?apiKey={self.api_key}&ip={ip}"
 
+    def get_bulk_url(self) -> str | None:
+        # Sólo para planes pagos: con una key gratis responde 401 y se sigue de a
+        # una IP
+        return f"https://api.ipgeolocation.io/ipgeo-bulk?apiKey={self.api_key}"
+
     def get_uncached_ip_location(self, ip: IPAddress) -> WorldCoordinates:
         return self.get_location_from_request(ip)
+
+    def get_uncached_ip_locations(
+        self, ips: list[IPAddress]
+    ) -> dict[IPAddress, WorldCoordinates]:
+        return self.get_locations_from_requests(ips)
+
+
+def ip_to_int(ip: IPAddress) -> int:
+    return struct.unpack("!I", socket.inet_aton(ip))[0]
+
+
+class OfflineGeolocationClient(GeolocationAPIClient):
+    """
+    Geolocaliza sin red, usando una base local de rangos de IPs.
+
+    La base es un CSV con encabezado que tiene las columnas latitude y longitude,
+    y los rangos como network (en notación CIDR, como GeoLite2-City-Blocks) o como
+    start_ip y end_ip. Al leer un CSV se guarda al lado una versión binaria
+    (.npz), que es la que se usa las veces siguientes.
+
+    Los rangos se guardan ordenados por su primera IP, así que cada consulta es
+    una búsqueda binaria.
+    """
+
+    name = "offline"
+
+    def __init__(self, database_path: str | None = None) -> None:
+        if database_path is None:
+            database_path = os.environ.get(
+                "GEOLOCATION_DATABASE", str(CACHE_DIRECTORY / "ip_ranges.csv")
+            )
+        path = Path(database_path)
+        compact_path = path.with_suffix(".npz")
+
+        if path.suffix != ".npz" and (
+            not compact_path.exists()
+            or compact_path.stat().st_mtime < path.stat().st_mtime
+        ):
+            self.save_ranges(compact_path, *self.read_csv_ranges(path))
+
+        with np.load(compact_path) as ranges:
+            order = np.argsort(ranges["starts"], kind="stable")
+            # Listas de Python: bisect sobre una lista es más rápido que
+            # np.searchsorted para una sola IP
+            self.starts: list[int] = ranges["starts"][order].tolist()
+            self.ends: list[int] = ranges["ends"][order].tolist()
+            self.latitudes: list[float] = ranges["latitudes"][order].tolist()
+            self.longitudes: list[float] = ranges["longitudes"][order].tolist()
+
+    @staticmethod
+    def read_csv_ranges(
+        path: Path,
+    ) -> tuple[list[int], list[int], list[float], list[float]]:
+        starts: list[int] = []
+        ends: list[int] = []
+        latitudes: list[float] = []
+        longitudes: list[float] = []
+
+        with open(path, "r", newline="") as database_file:
+            for row in csv.DictReader(database_file):
+                if not row["latitude"] or not row["longitude"]:
+                    continue
+
+                if "network" in row:
+                    network, _, prefix_length = row["network"].partition("/")
+                    start = ip_to_int(network)
+                    end = start + 2 ** (32 - int(prefix_length or 32)) - 1
+                else:
+                    start, end = ip_to_int(row["start_ip"]), ip_to_int(row["end_ip"])
+
+                starts.append(start)
+                ends.append(end)
+                latitudes.append(float(row["latitude"]))
+                longitudes.append(float(row["longitude"]))
+
+        return starts, ends, latitudes, longitudes
+
+    @staticmethod
+    def save_ranges(
+        path: Path,
+        starts: list[int],
+        ends: list[int],
+        latitudes: list[float],
+        longitudes: list[float],
+    ) -> None:
+        with open(path, "wb") as compact_file:
+            np.savez(
+                compact_file,
+                starts=np.array(starts, dtype=np.uint32),
+                ends=np.array(ends, dtype=np.uint32),
+                latitudes=np.array(latitudes, dtype=np.float64),
+                longitudes=np.array(longitudes, dtype=np.float64),
+            )
+
+    def get_ip_location(self, ip: IPAddress) -> WorldCoordinates:
+        ip_number = ip_to_int(ip)
+        i = bisect_right(self.starts, ip_number) - 1
+
+        if i < 0 or self.ends[i] < ip_number:
+            raise LookupError(f"No hay ubicación para {ip}")
+
+        return WorldCoordinates(self.latitudes[i], self.longitudes[i])
+
+    def get_ip_locations(
+        self, ips: Iterable[IPAddress]
+    ) -> dict[IPAddress, WorldCoordinates]:
+        # No hay requests que paralelizar
+        return {ip: self.get_ip_location(ip) for ip in dict.fromkeys(ips)}
+
+
+class FanoutGeolocationClient(CachedGeolocationAPIClient):
+    """
+    Consulta varios proveedores y se queda con la primera respuesta buena.
+
+    Los proveedores se prueban en orden: si uno falla se pasa enseguida al
+    siguiente, y si no respondió dentro de su presupuesto de tiempo se lanza
+    también el siguiente sin cancelar el anterior (hedging), y gana el primero
+    que responda. Lo que se obtiene queda en el cache compartido (el de
+    ipgeolocationio, que es el que usa generate-maps.sh), así que la próxima vez
+    no se le pregunta a nadie.
+
+    Los proveedores y los presupuestos (en segundos) salen de los argumentos o de
+    las variables de entorno GEOLOCATION_PROVIDERS (por ejemplo
+    "offline,ipgeolocationio,dazzlepod") y GEOLOCATION_BUDGETS (por ejemplo
+    "offline=0.05,ipgeolocationio=2").
+    """
+
+    name = "fanout"
+    default_providers = "offline,ipgeolocationio,dazzlepod"
+    default_budget = 1.0
+
+    def __init__(
+        self,
+        providers: list[str] | None = None,
+        budgets: Mapping[str, float] | None = None,
+    ) -> None:
+        super().__init__()
+
+        if providers is None:
+            providers = os.environ.get(
+                "GEOLOCATION_PROVIDERS", self.default_providers
+            ).split(",")
+        if budgets is None:
+            budgets = {
+                name: float(budget)
+                for name, _, budget in (
+                    entry.partition("=")
+                    for entry in os.environ.get("GEOLOCATION_BUDGETS", "").split(",")
+                    if entry
+                )
+            }
+        self.budgets = dict(budgets)
+
+        self.providers: list[tuple[str, GeolocationAPIClient]] = []
+        for name in providers:
+            name = name.strip()
+            if name == self.name:
+                continue
+            # Un proveedor sin API key o sin base local no impide usar los demás
+            try:
+                self.providers.append((name, GeolocationAPIClient.get_client(name)))
+            except Exception as error:
+                if os.environ.get("DEBUG"):
+                    print(f"No se pudo usar {name}: {error!r}")
+
+        assert self.providers, "No hay ningún proveedor de geolocalización"
+
+        self.executor = ThreadPoolExecutor(
+            max_workers=MAX_CONCURRENT_REQUESTS * len(self.providers)
+        )
+
+    @classmethod
+    def get_cache_path(cls) -> Path:
+        return IPGeolocationIOClient.get_cache_path()
+
+    def close(self) -> None:
+        # Sin esperar a los proveedores que perdieron la carrera
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def first_answer(self, query: Callable[[GeolocationAPIClient], T]) -> T:
+        """
+        Retorna la primera respuesta buena de query(proveedor), lanzando los
+        proveedores de a uno según sus presupuestos.
+        """
+        remaining = list(self.providers)
+        running: dict[Future, str] = {}
+        errors: list[str] = []
+
+        while remaining or running:
+            timeout = None
+            if remaining:
+                name, provider = remaining.pop(0)
+                running[self.executor.submit(query, provider)] = name
+                timeout = self.budgets.get(name, self.default_budget)
+
+            done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    answer = future.result()
+                except Exception as error:
+                    errors.append(f"{name}: {error!r}")
+                    continue
+                if os.environ.get("DEBUG"):
+                    print(f"Respondió {name}")
+                return answer
+
+        raise LookupError(f"Ningún proveedor respondió ({'; '.join(errors)})")
+
+    def get_uncached_ip_location(self, ip: IPAddress) -> WorldCoordinates:
+        return self.first_answer(lambda provider: provider.get_ip_location(ip))
+
+    def get_uncached_ip_locations(
+        self, ips: list[IPAddress]
+    ) -> dict[IPAddress, WorldCoordinates]:
+        try:
+            return self.first_answer(lambda provider: provider.get_ip_locations(ips))
+        except LookupError:
+            # Puede que ningún proveedor conozca todas las IPs, pero entre todos sí
+            return dict(zip(ips, map_concurrently(self.get_uncached_ip_location, ips)))
@@ -1,8 +1,7 @@
-import dotenv
-import geopandas as gpd
-import matplotlib.pyplot as plt
-from shapely.geometry import LineString
-from tqdm import tqdm
+from itertools import product
+from typing import TYPE_CHECKING
+
+import numpy as np
 
 from geolocation.api import GeolocationAPIClient, WorldCoordinates, get_my_ip
 from traceroute import (
@@ -10,7 +9,9 @@ from traceroute import (
     TTLRoute,
 )
 
-dotenv.load_dotenv()
+# geopandas, matplotlib y shapely se importan sólo al graficar
+if TYPE_CHECKING:
+    from matplotlib.axes import Axes
 
 
 def geolocate_route(
@@ -29,11 +30,52 @@ def geolocate_route(
         rtt_time=route[0].rtt_time if isinstance(route[0], RouterResponse) else 0,
     )
 
-    return [
-        api_client.get_ip_location(response.ip)
-        for response in tqdm(route, desc="Geolocalizando ruta")
-        if isinstance(response, RouterResponse)  # TODO (capaz): Manejar NoResponse
-    ]
+    # TODO (capaz): Manejar NoResponse
+    ips = [response.ip for response in route if isinstance(response, RouterResponse)]
+    locations = api_client.get_ip_locations(ips)
+
+    return [locations[ip] for ip in ips]
+
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_distance(
+    latitudes_a: np.ndarray,
+    longitudes_a: np.ndarray,
+    latitudes_b: np.ndarray,
+    longitudes_b: np.ndarray,
+) -> np.ndarray:
+    """
+    Devuelve la distancia (en km) entre cada punto a y su punto b correspondiente,
+    con la fórmula de haversine. Las coordenadas están en grados.
+    """
+    lat_a, lon_a = np.radians(latitudes_a), np.radians(longitudes_a)
+    lat_b, lon_b = np.radians(latitudes_b), np.radians(longitudes_b)
+
+    a = (
+        np.sin((lat_b - lat_a) / 2) ** 2
+        + np.cos(lat_a) * np.cos(lat_b) * np.sin((lon_b - lon_a) / 2) ** 2
+    )
+
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def haversine_distances(
+    latitudes_a: np.ndarray,
+    longitudes_a: np.ndarray,
+    latitudes_b: np.ndarray,
+    longitudes_b: np.ndarray,
+) -> np.ndarray:
+    """
+    Devuelve la matriz de distancias (en km) entre los puntos a y los puntos b.
+    """
+    return haversine_distance(
+        np.asarray(latitudes_a)[:, None],
+        np.asarray(longitudes_a)[:, None],
+        np.asarray(latitudes_b)[None, :],
+        np.asarray(longitudes_b)[None, :],
+    )
 
 
 class Cluster:
@@ -45,11 +87,6 @@ class Cluster:
         self.points.append(point)
         self.indices.append(index)
 
-    def should_add_point(self, point: WorldCoordinates, tol: float) -> bool:
-        return all(
-            point.distance_from(other_point) < tol for other_point in self.points
-        )
-
     @property
     def center(self) -> WorldCoordinates:
         """
@@ -70,25 +107,86 @@ def get_point_clusters(
 ) -> list[Cluster]:
     """
     Devuelve los índices de los puntos que forman clusters de radio tol.
+
+    Es single-linkage (o DBSCAN con un solo punto como mínimo): dos puntos están
+    en el mismo cluster si se puede ir de uno al otro saltando entre puntos a
+    menos de tol km. Los clusters se devuelven ordenados por su primer punto.
     """
+    if not route_coordinates:
+        return []
+
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import connected_components
+
+    latitudes = np.array([float(point.latitude) for point in route_coordinates])
+    longitudes = np.array([float(point.longitude) for point in route_coordinates])
+
+    # Para no comparar todos contra todos, agrupo los puntos en una grilla de
+    # cubos de lado (al menos) tol sobre sus coordenadas cartesianas. Dos puntos a
+    # menos de tol km sobre la esfera están en el mismo cubo o en cubos vecinos.
+    lat, lon = np.radians(latitudes), np.radians(longitudes)
+    cartesian = EARTH_RADIUS_KM * np.stack(
+        [np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)], axis=1
+    )
+    # Con cubos de más de 2^-20 diámetros terrestres, la clave entra en un int64
+    cell_size = max(tol, 2 * EARTH_RADIUS_KM / 2**20)
+    cells = np.floor(cartesian / cell_size).astype(np.int64)
+    cells -= cells.min(axis=0) - 1
+    dimensions = cells.max(axis=0) + 2
+
+    def cell_key(cells: np.ndarray) -> np.ndarray:
+        return (cells[:, 0] * dimensions[1] + cells[:, 1]) * dimensions[2] + cells[:, 2]
+
+    order = np.argsort(cell_key(cells), kind="stable")
+    sorted_keys = cell_key(cells)[order]
+
+    sources: list[np.ndarray] = []
+    targets: list[np.ndarray] = []
+
+    for offset in product((-1, 0, 1), repeat=3):
+        # Para cada punto, el rango de order con los puntos del cubo vecino
+        neighbour_keys = cell_key(cells + offset)
+        first = np.searchsorted(sorted_keys, neighbour_keys, side="left")
+        counts = np.searchsorted(sorted_keys, neighbour_keys, side="right") - first
+
+        candidates = np.repeat(np.arange(len(cells)), counts)
+        positions = np.arange(counts.sum()) + np.repeat(
+            first - (np.cumsum(counts) - counts), counts
+        )
+        neighbours = order[positions]
+
+        close = (
+            haversine_distance(
+                latitudes[candidates],
+                longitudes[candidates],
+                latitudes[neighbours],
+                longitudes[neighbours],
+            )
+            < tol
+        )
+        sources.append(candidates[close])
+        targets.append(neighbours[close])
+
+    adjacency = coo_matrix(
+        (
+            np.ones(sum(map(len, sources)), dtype=bool),
+            (np.concatenate(sources), np.concatenate(targets)),
+        ),
+        shape=(len(route_coordinates), len(route_coordinates)),
+    )
+    _, labels = connected_components(adjacency, directed=False)
+
+    clusters: dict[int, Cluster] = {}
+    for i, (label, point) in enumerate(zip(labels, route_coordinates)):
+        clusters.setdefault(label, Cluster()).add_point(point, i)
 
-    # Estrategia greedy: se toma el primer punto y se van agregando los que están a
-    # distancia tol de él. No es correcta pero nuestros clusters están muy marcados.
-    clusters: list[Cluster] = []
-    for i, point in enumerate(route_coordinates):
-        for cluster in clusters:
-            if cluster.should_add_point(point, tol):
-                cluster.add_point(point, i)
-                break
-        else:
-            cluster = Cluster()
-            cluster.add_point(point, i)
-            clusters.append(cluster)
+    return list(clusters.values())
 
-    return clusters
 
+def plot_route(route_coordinates: list[WorldCoordinates], ax: "Axes") -> None:
+    import geopandas as gpd
+    from shapely.geometry import LineString
 
-def plot_route(route_coordinates: list[WorldCoordinates], ax: plt.Axes) -> None:
     route_line = LineString(
         [(point.longitude, point.latitude) for point in route_coordinates]
     )
@@ -97,7 +195,7 @@ def plot_route(route_coordinates: list[WorldCoordinates], ax: plt.Axes) -> None:
 
 
 def plot_route_clusters(
-    route_coordinates: list[WorldCoordinates], index_to_ttl: list[int], ax: plt.Axes
+    route_coordinates: list[WorldCoordinates], index_to_ttl: list[int], ax: "Axes"
 ) -> None:
     clusters = get_point_clusters(route_coordinates)
 
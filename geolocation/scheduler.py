@@ -0,0 +1,262 @@
+import random
+import sqlite3
+from concurrent.futures import Future
+from datetime import datetime, timezone
+from pathlib import Path
+from threading import Lock
+from time import sleep
+from typing import Any, Callable, Hashable, TypeVar
+
+from rate_limit import TokenBucket
+
+K = TypeVar("K", bound=Hashable)
+
+
+class QuotaExceededError(Exception):
+    pass
+
+
+class QuotaCounter:
+    """
+    Cuenta cuántas consultas se le hicieron a un proveedor en el día y en el mes
+    (UTC), en una tabla de SQLite compartida por todos los procesos.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        provider: str,
+        daily_limit: int | None = None,
+        monthly_limit: int | None = None,
+    ) -> None:
+        self.provider = provider
+        self.limits = {"day": daily_limit, "month": monthly_limit}
+
+        self.connection = sqlite3.connect(
+            path, timeout=60, isolation_level=None, check_same_thread=False
+        )
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS quota "
+            "(provider TEXT, period TEXT, count INTEGER, "
+            "PRIMARY KEY (provider, period))"
+        )
+        self.lock = Lock()
+
+    @staticmethod
+    def current_periods() -> dict[str, str]:
+        now = datetime.now(timezone.utc)
+        return {"day": now.strftime("%Y-%m-%d"), "month": now.strftime("%Y-%m")}
+
+    def used(self) -> dict[str, int]:
+        """Cuántas consultas se usaron en el día y en el mes actuales."""
+        used = {}
+        with self.lock:
+            for kind, period in self.current_periods().items():
+                row = self.connection.execute(
+                    "SELECT count FROM quota WHERE provider = ? AND period = ?",
+                    (self.provider, period),
+                ).fetchone()
+                used[kind] = row[0] if row else 0
+        return used
+
+    def reserve(self, amount: int = 1) -> dict[str, str]:
+        """
+        Anota amount consultas, o levanta QuotaExceededError sin anotar nada si
+        alguno de los límites no alcanza. Retorna los períodos en los que se
+        anotaron, para poder devolverlas con release.
+        """
+        periods = self.current_periods()
+
+        with self.lock:
+            # BEGIN IMMEDIATE bloquea a los otros procesos entre leer y escribir
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                for kind, period in periods.items():
+                    row = self.connection.execute(
+                        "SELECT count FROM quota WHERE provider = ? AND period = ?",
+                        (self.provider, period),
+                    ).fetchone()
+                    used = row[0] if row else 0
+                    limit = self.limits[kind]
+                    if limit is not None and used + amount > limit:
+                        raise QuotaExceededError(
+                            f"Se agotó la cuota de {self.provider} "
+                            f"({used}/{limit} en {period})"
+                        )
+
+                for period in periods.values():
+                    self.connection.execute(
+                        "INSERT INTO quota VALUES (?, ?, ?) "
+                        "ON CONFLICT (provider, period) "
+                        "DO UPDATE SET count = count + excluded.count",
+                        (self.provider, period, amount),
+                    )
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+            self.connection.execute("COMMIT")
+
+        return periods
+
+    def release(self, amount: int, periods: dict[str, str]) -> None:
+        """Devuelve amount consultas anotadas por reserve en esos períodos."""
+        with self.lock:
+            with self.connection:
+                for period in periods.values():
+                    self.connection.execute(
+                        "UPDATE quota SET count = max(count - ?, 0) "
+                        "WHERE provider = ? AND period = ?",
+                        (amount, self.provider, period),
+                    )
+
+
+def is_retryable(error: Exception) -> bool:
+    import requests
+
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        status = error.response.status_code
+        return status == 429 or status >= 500
+    return False
+
+
+def is_rejected(error: Exception) -> bool:
+    """Si el proveedor rechazó la consulta por falta de permisos (401 o 403)."""
+    import requests
+
+    return (
+        isinstance(error, requests.HTTPError)
+        and error.response is not None
+        and error.response.status_code in (401, 403)
+    )
+
+
+def retry_after(error: Exception) -> float | None:
+    """Lo que pide esperar el header Retry-After de la respuesta, si lo tiene."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers["Retry-After"])
+    except (KeyError, ValueError):
+        return None
+
+
+class RequestScheduler:
+    """
+    Hace las consultas a un proveedor de geolocalización respetando su tasa
+    máxima (token bucket) y su cuota diaria y mensual, reintentando con backoff
+    exponencial cuando responde 429 o 5xx.
+
+    Las consultas por IPs que ya están en vuelo no se repiten: se espera la
+    respuesta de la que ya se hizo. Hay un scheduler por proveedor, compartido
+    por todos sus clientes.
+    """
+
+    schedulers: dict[str, "RequestScheduler"] = {}
+    schedulers_lock = Lock()
+
+    def __init__(
+        self,
+        requests_per_second: float,
+        quota: QuotaCounter | None = None,
+        max_retries: int = 5,
+        backoff: float = 0.5,
+    ) -> None:
+        self.bucket = TokenBucket(requests_per_second)
+        self.quota = quota
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+        self.in_flight: dict[Any, Future] = {}
+        self.in_flight_lock = Lock()
+
+    @staticmethod
+    def for_provider(
+        name: str,
+        requests_per_second: float,
+        quota_path: Path | None = None,
+        daily_quota: int | None = None,
+        monthly_quota: int | None = None,
+    ) -> "RequestScheduler":
+        with RequestScheduler.schedulers_lock:
+            if name not in RequestScheduler.schedulers:
+                quota = None
+                if quota_path is not None and (daily_quota or monthly_quota):
+                    quota_path.parent.mkdir(exist_ok=True)
+                    quota = QuotaCounter(quota_path, name, daily_quota, monthly_quota)
+                RequestScheduler.schedulers[name] = RequestScheduler(
+                    requests_per_second, quota
+                )
+            return RequestScheduler.schedulers[name]
+
+    def call(self, f: Callable[[list[K]], dict[K, Any]], keys: list[K]) -> dict[K, Any]:
+        """Llama a f(keys) respetando la tasa y la cuota, con reintentos."""
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            # Se cobra cada intento, porque algunos proveedores cuentan los fallidos
+            periods = None
+            if self.quota is not None:
+                periods = self.quota.reserve(len(keys))
+
+            try:
+                return f(keys)
+            except Exception as error:
+                # Salvo los rechazados por falta de permisos (como el endpoint
+                # bulk en el plan gratis), que no se responden ni se cuentan
+                if (
+                    self.quota is not None
+                    and periods is not None
+                    and is_rejected(error)
+                ):
+                    self.quota.release(len(keys), periods)
+                if attempt == self.max_retries or not is_retryable(error):
+                    raise
+                delay = retry_after(error)
+                if delay is None:
+                    delay = self.backoff * 2**attempt * random.uniform(1, 2)
+                sleep(delay)
+
+        raise AssertionError("unreachable")
+
+    def run_many(
+        self, keys: list[K], f: Callable[[list[K]], dict[K, Any]]
+    ) -> dict[K, Any]:
+        """
+        Retorna {key: resultado} para cada key, llamando a f sólo con las keys que
+        no están ya en vuelo.
+        """
+        own: dict[K, Future] = {}
+        others: dict[K, Future] = {}
+        with self.in_flight_lock:
+            for key in dict.fromkeys(keys):
+                if key in self.in_flight:
+                    others[key] = self.in_flight[key]
+                else:
+                    own[key] = self.in_flight[key] = Future()
+
+        try:
+            if own:
+                results = self.call(f, list(own))
+                for key, future in own.items():
+                    if key in results:
+                        future.set_result(results[key])
+                    else:
+                        future.set_exception(LookupError(f"Sin respuesta para {key}"))
+        except BaseException as error:
+            for future in own.values():
+                if not future.done():
+                    future.set_exception(error)
+            raise
+        finally:
+            with self.in_flight_lock:
+                for key in own:
+                    del self.in_flight[key]
+
+        futures = {**own, **others}
+        return {key: futures[key].result() for key in dict.fromkeys(keys)}
+
+    def run(self, key: K, f: Callable[[], Any]) -> Any:
+        return self.run_many([key], lambda _: {key: f()})[key]
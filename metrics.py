@@ -0,0 +1,222 @@
+"""
+Contadores e histogramas para saber en qué se va el tiempo al medir.
+
+Las métricas se registran siempre (cuestan un lock y una suma), y se pueden
+exportar en el formato de texto de Prometheus o como JSON. Cada métrica puede
+tener labels, que se pasan como keyword arguments.
+"""
+
+import cProfile
+import json
+from argparse import ArgumentParser
+from bisect import bisect_left
+from contextlib import contextmanager
+from threading import Lock
+from time import perf_counter
+from typing import Any, Iterator
+
+Labels = tuple[tuple[str, str], ...]
+
+# En segundos, desde 100µs hasta 30s
+LATENCY_BUCKETS = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+
+
+def labels_key(labels: dict[str, Any]) -> Labels:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def format_labels(labels: Labels, extra: tuple[str, str] | None = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str) -> None:
+        self.name = name
+        self.help = help
+        self.values: dict[Labels, float] = {}
+        self.lock = Lock()
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = labels_key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def prometheus_lines(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{format_labels(labels)} {value}")
+        return lines
+
+    def snapshot(self) -> list[dict[str, Any]]:
+        return [
+            {"labels": dict(labels), "value": value}
+            for labels, value in sorted(self.values.items())
+        ]
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: tuple[float, ...]) -> None:
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        # Por cada combinación de labels: (cuentas por bucket, suma, cantidad)
+        self.values: dict[Labels, tuple[list[int], float, int]] = {}
+        self.lock = Lock()
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = labels_key(labels)
+        i = bisect_left(self.buckets, value)
+        with self.lock:
+            counts, total, count = self.values.get(
+                key, ([0] * (len(self.buckets) + 1), 0.0, 0)
+            )
+            counts[i] += 1
+            self.values[key] = (counts, total + value, count + 1)
+
+    @contextmanager
+    def time(self, **labels: Any) -> Iterator[None]:
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(perf_counter() - start, **labels)
+
+    def prometheus_lines(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, count) in sorted(self.values.items()):
+            accumulated = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                accumulated += bucket_count
+                lines.append(
+                    f"{self.name}_bucket{format_labels(labels, ('le', str(bound)))}"
+                    f" {accumulated}"
+                )
+            lines.append(
+                f"{self.name}_bucket{format_labels(labels, ('le', '+Inf'))} {count}"
+            )
+            lines.append(f"{self.name}_sum{format_labels(labels)} {total}")
+            lines.append(f"{self.name}_count{format_labels(labels)} {count}")
+        return lines
+
+    def snapshot(self) -> list[dict[str, Any]]:
+        return [
+            {
+                "labels": dict(labels),
+                "buckets": dict(zip(map(str, self.buckets + (float("inf"),)), counts)),
+                "sum": total,
+                "count": count,
+            }
+            for labels, (counts, total, count) in sorted(self.values.items())
+        ]
+
+
+class Registry:
+    def __init__(self) -> None:
+        self.metrics: dict[str, Counter | Histogram] = {}
+        self.lock = Lock()
+
+    def counter(self, name: str, help: str = "") -> Counter:
+        with self.lock:
+            metric = self.metrics.setdefault(name, Counter(name, help))
+        assert isinstance(metric, Counter)
+        return metric
+
+    def histogram(
+        self, name: str, help: str = "", buckets: tuple[float, ...] = LATENCY_BUCKETS
+    ) -> Histogram:
+        with self.lock:
+            metric = self.metrics.setdefault(name, Histogram(name, help, buckets))
+        assert isinstance(metric, Histogram)
+        return metric
+
+    def prometheus_text(self) -> str:
+        return (
+            "\n".join(
+                line
+                for metric in self.metrics.values()
+                for line in metric.prometheus_lines()
+            )
+            + "\n"
+        )
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            name: {
+                "type": type(metric).__name__.lower(),
+                "help": metric.help,
+                "values": metric.snapshot(),
+            }
+            for name, metric in self.metrics.items()
+        }
+
+    def write(self, path: str) -> None:
+        """Guarda las métricas como JSON si path termina en .json, o si no como texto
+        de Prometheus."""
+        with open(path, "w") as metrics_file:
+            if path.endswith(".json"):
+                json.dump(self.snapshot(), metrics_file, indent=2)
+            else:
+                metrics_file.write(self.prometheus_text())
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+histogram = REGISTRY.histogram
+
+
+@contextmanager
+def instrumented(
+    metrics_path: str | None = None, profile_path: str | None = None
+) -> Iterator[None]:
+    """
+    Corre el bloque con cProfile si se pasa profile_path (y guarda las estadísticas
+    ahí, para leerlas con pstats o snakeviz), y al terminar guarda las métricas en
+    metrics_path.
+    """
+    profiler = cProfile.Profile() if profile_path is not None else None
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler is not None and profile_path is not None:
+            profiler.disable()
+            profiler.dump_stats(profile_path)
+        if metrics_path is not None:
+            REGISTRY.write(metrics_path)
+
+
+def add_instrumentation_arguments(parser: ArgumentParser) -> None:
+    parser.add_argument(
+        "--metrics",
+        type=str,
+        default=None,
+        help="Archivo donde guardar las métricas (.json, o si no texto de Prometheus)",
+    )
+    parser.add_argument(
+        "--profile",
+        type=str,
+        default=None,
+        help="Archivo donde guardar las estadísticas de cProfile",
+    )
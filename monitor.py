@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+"""
+Monitoreo continuo de rutas: traza los destinos cada cierto intervalo y avisa
+cuando cambia el camino o la latencia de algún salto.
+
+Todo lo que se guarda está acotado: las rutas recientes de cada destino en un
+ring buffer, las estadísticas de cada salto como promedios exponenciales, y los
+archivos en disco rotan al llegar a un tamaño máximo.
+"""
+
+import json
+import math
+import os
+from argparse import ArgumentParser
+from collections import deque
+from contextlib import ExitStack
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from time import monotonic, sleep
+from typing import IO, Any
+
+from sample_destinations import load_destinations, parse_destination
+from stats import average_route
+from traceroute import (
+    MAX_TTL,
+    IPAddress,
+    RouterResponse,
+    SampleWriter,
+    TTLRoute,
+    prober_from_args,
+    sample_many_routes,
+)
+
+
+def rotate_file(path: Path, backups: int) -> None:
+    """Renombra path a path.1, path.1 a path.2, etc., borrando el más viejo."""
+    for i in range(backups, 0, -1):
+        source = path if i == 1 else path.with_name(f"{path.name}.{i - 1}")
+        if source.exists():
+            os.replace(source, path.with_name(f"{path.name}.{i}"))
+    if path.exists():
+        path.unlink()
+
+
+class RotatingSampleWriter(SampleWriter):
+    """
+    Un SampleWriter que, cuando el archivo pasa de max_bytes, lo rota y empieza
+    uno nuevo, guardando a lo sumo backups archivos viejos.
+    """
+
+    def __init__(self, path: str, max_bytes: int, backups: int) -> None:
+        super().__init__(path, append=True)
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.backups = backups
+
+    def write(self, route: TTLRoute) -> None:
+        super().write(route)
+        if self.file.tell() >= self.max_bytes:
+            self.file.close()
+            rotate_file(self.path, self.backups)
+            self.file = open(self.path, "w")
+
+
+@dataclass
+class RouteEvent:
+    time: str
+    destination: str
+    kind: str
+    ttl: int | None
+    description: str
+
+
+class EventLog:
+    """Guarda los eventos como JSON, uno por línea, rotando igual que las rutas."""
+
+    def __init__(self, path: str, max_bytes: int, backups: int) -> None:
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.file: IO[str] = open(self.path, "a")
+
+    def write(self, event: RouteEvent) -> None:
+        self.file.write(json.dumps(asdict(event)) + "\n")
+        self.file.flush()
+        if self.file.tell() >= self.max_bytes:
+            self.file.close()
+            rotate_file(self.path, self.backups)
+            self.file = open(self.path, "w")
+
+    def close(self) -> None:
+        self.file.close()
+
+    def __enter__(self) -> "EventLog":
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        self.close()
+
+
+@dataclass
+class HopLatency:
+    """Media y varianza exponenciales del RTT de un salto."""
+
+    mean: float
+    variance: float = 0.0
+    shifted: bool = False
+
+    def add(self, rtt: float, smoothing: float) -> None:
+        delta = rtt - self.mean
+        self.mean += smoothing * delta
+        self.variance = (1 - smoothing) * (self.variance + smoothing * delta**2)
+
+
+@dataclass
+class Baseline:
+    """La ruta promedio contra la que se compara, y la dispersión de cada salto."""
+
+    route: TTLRoute
+    rtt_std: dict[int, float]
+
+    @staticmethod
+    def from_routes(routes: list[TTLRoute]) -> "Baseline":
+        route = average_route(routes)
+        rtt_std: dict[int, float] = {}
+        for response in route:
+            if not isinstance(response, RouterResponse):
+                continue
+            rtts = [
+                hop.rtt_time
+                for other in routes
+                if response.ttl < len(other)
+                and isinstance(hop := other[response.ttl], RouterResponse)
+                and hop.ip == response.ip
+            ]
+            mean = sum(rtts) / len(rtts)
+            rtt_std[response.ttl] = math.sqrt(
+                sum((rtt - mean) ** 2 for rtt in rtts) / len(rtts)
+            )
+        return Baseline(route, rtt_std)
+
+    def ip_at(self, ttl: int) -> IPAddress | None:
+        if ttl >= len(self.route):
+            return None
+        hop = self.route[ttl]
+        if isinstance(hop, RouterResponse):
+            return hop.ip
+        return None
+
+
+@dataclass
+class DestinationMonitor:
+    """
+    El estado de un destino: sus últimas window rutas, la línea de base calculada
+    con average_route sobre ellas, y el RTT exponencial de cada salto.
+
+    Hay cambio de camino cuando confirmations rutas seguidas difieren de la
+    línea de base en al menos path_change_fraction de sus saltos (o en el
+    largo). Hay cambio de latencia cuando el RTT exponencial de un salto se aleja
+    de la línea de base más de shift_deviations desvíos y de min_shift segundos.
+    """
+
+    destination: str
+    window: int = 64
+    min_samples: int = 8
+    confirmations: int = 3
+    path_change_fraction: float = 0.3
+    smoothing: float = 0.1
+    shift_deviations: float = 3.0
+    min_shift: float = 0.005
+
+    routes: deque[TTLRoute] = field(init=False)
+    baseline: Baseline | None = None
+    hops: dict[int, HopLatency] = field(default_factory=dict)
+    changed_routes: int = 0
+    routes_since_baseline: int = 0
+
+    def __post_init__(self) -> None:
+        self.routes = deque(maxlen=self.window)
+
+    def event(self, kind: str, ttl: int | None, description: str) -> RouteEvent:
+        return RouteEvent(
+            time=datetime.now(timezone.utc).isoformat(),
+            destination=self.destination,
+            kind=kind,
+            ttl=ttl,
+            description=description,
+        )
+
+    def rebuild_baseline(self) -> None:
+        self.baseline = Baseline.from_routes(list(self.routes))
+        self.routes_since_baseline = 0
+        self.hops = {
+            response.ttl: HopLatency(mean=response.rtt_time)
+            for response in self.baseline.route
+            if isinstance(response, RouterResponse)
+        }
+
+    def differs_from_baseline(self, route: TTLRoute) -> bool:
+        assert self.baseline is not None
+        if len(route) != len(self.baseline.route):
+            return True
+
+        compared = 0
+        different = 0
+        for response in route:
+            baseline_ip = self.baseline.ip_at(response.ttl)
+            if isinstance(response, RouterResponse) and baseline_ip is not None:
+                compared += 1
+                different += response.ip != baseline_ip
+
+        return compared > 0 and different / compared >= self.path_change_fraction
+
+    def add_route(self, route: TTLRoute) -> list[RouteEvent]:
+        self.routes.append(route)
+
+        if self.baseline is None:
+            if len(self.routes) >= self.min_samples:
+                self.rebuild_baseline()
+            return []
+
+        events = []
+
+        if self.differs_from_baseline(route):
+            self.changed_routes += 1
+            if self.changed_routes >= self.confirmations:
+                old_path = [self.baseline.ip_at(ttl) for ttl in range(len(route))]
+                new_path = [
+                    response.ip if isinstance(response, RouterResponse) else None
+                    for response in route
+                ]
+                events.append(
+                    self.event("path_change", None, f"{old_path} -> {new_path}")
+                )
+                # La nueva línea de base sale sólo de las rutas del camino nuevo, y
+                # como al empezar se arma recién cuando hay min_samples (con las
+                # pocas confirmaciones el desvío de cada salto no es confiable)
+                recent = list(self.routes)[-self.changed_routes :]
+                self.routes.clear()
+                self.routes.extend(recent)
+                self.changed_routes = 0
+                self.baseline = None
+                self.hops = {}
+                if len(self.routes) >= self.min_samples:
+                    self.rebuild_baseline()
+            return events
+
+        self.changed_routes = 0
+
+        for response in route:
+            hop = self.hops.get(response.ttl)
+            if (
+                hop is None
+                or not isinstance(response, RouterResponse)
+                or response.ip != self.baseline.ip_at(response.ttl)
+            ):
+                continue
+
+            hop.add(response.rtt_time, self.smoothing)
+            baseline_hop = self.baseline.route[response.ttl]
+            assert isinstance(baseline_hop, RouterResponse)
+            baseline_rtt = baseline_hop.rtt_time
+            shift = hop.mean - baseline_rtt
+            threshold = max(
+                self.min_shift,
+                self.shift_deviations * self.baseline.rtt_std.get(response.ttl, 0),
+            )
+
+            if abs(shift) > threshold and not hop.shifted:
+                hop.shifted = True
+                events.append(
+                    self.event(
+                        "latency_shift",
+                        response.ttl,
+                        f"{response.ip}: {baseline_rtt * 1000:.2f}ms -> "
+                        f"{hop.mean * 1000:.2f}ms",
+                    )
+                )
+            elif abs(shift) <= threshold and hop.shifted:
+                hop.shifted = False
+                events.append(
+                    self.event(
+                        "latency_recovered",
+                        response.ttl,
+                        f"{response.ip}: {hop.mean * 1000:.2f}ms",
+                    )
+                )
+
+        # Cada window rutas la línea de base se actualiza, para seguir cambios lentos
+        self.routes_since_baseline += 1
+        if self.routes_since_baseline >= self.window:
+            self.rebuild_baseline()
+
+        return events
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument(
+        "destinations", nargs="*", help="Destinos, como nombre=ip o sólo ip"
+    )
+    parser.add_argument(
+        "--destinations-file",
+        type=str,
+        default=None,
+        help="Archivo con un destino por línea",
+    )
+    parser.add_argument(
+        "--interval", type=float, default=60, help="Segundos entre rondas"
+    )
+    parser.add_argument(
+        "--window", type=int, default=64, help="Rutas recientes que se guardan"
+    )
+    parser.add_argument(
+        "--max-ttl", type=int, default=MAX_TTL, help="TTL máximo para traceroute"
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=1, help="Timeout para cada ronda"
+    )
+    parser.add_argument(
+        "--raw-socket",
+        action="store_true",
+        default=False,
+        help="Enviar todos los paquetes por un único socket raw en vez de usar scapy",
+    )
+    parser.add_argument(
+        "--per-hop-rate",
+        type=float,
+        default=None,
+        help="Paquetes por segundo a cada salto (con --raw-socket)",
+    )
+    parser.add_argument(
+        "--output-dir",
+        type=str,
+        default="monitor",
+        help="Directorio donde guardar las rutas y los eventos",
+    )
+    parser.add_argument(
+        "--max-bytes",
+        type=int,
+        default=2**24,
+        help="Tamaño máximo de cada archivo antes de rotarlo",
+    )
+    parser.add_argument(
+        "--backups", type=int, default=4, help="Archivos rotados que se guardan"
+    )
+
+    args = parser.parse_args()
+
+    destinations = dict(map(parse_destination, args.destinations))
+    if args.destinations_file is not None:
+        destinations.update(load_destinations(args.destinations_file))
+
+    if not destinations:
+        parser.error("No se indicó ningún destino")
+
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(exist_ok=True)
+
+    monitors = {
+        ip: DestinationMonitor(name, window=args.window)
+        for name, ip in destinations.items()
+    }
+
+    with ExitStack() as stack:
+        prober = prober_from_args(args)
+        if prober is not None:
+            stack.enter_context(prober)
+
+        events = stack.enter_context(
+            EventLog(str(output_dir / "events.jsonl"), args.max_bytes, args.backups)
+        )
+        writers = {
+            ip: stack.enter_context(
+                RotatingSampleWriter(
+                    str(output_dir / f"{name}.samples"), args.max_bytes, args.backups
+                )
+            )
+            for name, ip in destinations.items()
+        }
+
+        next_round = monotonic()
+        while True:
+            # Una ronda que falla (por ejemplo, si se cae el enlace) se saltea y
+            # se sigue con la próxima
+            try:
+                routes = sample_many_routes(
+                    destinations.values(),
+                    samples_per_ttl=1,
+                    max_ttl=args.max_ttl,
+                    timeout=args.timeout,
+                    prober=prober,
+                    outputs=writers,
+                )
+            except Exception as e:
+                now = datetime.now(timezone.utc).isoformat()
+                print(f"[{now}] Falló la ronda: {e!r}")
+                routes = {}
+
+            for ip, destination_routes in routes.items():
+                for route in destination_routes:
+                    for event in monitors[ip].add_route(route):
+                        print(
+                            f"[{event.time}] {event.destination} {event.kind}: "
+                            f"{event.description}"
+                        )
+                        events.write(event)
+
+            next_round += args.interval
+            sleep(max(0.0, next_round - monotonic()))
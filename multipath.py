@@ -0,0 +1,237 @@
+"""
+Descubrimiento de caminos balanceados, al estilo de Paris traceroute y MDA.
+
+Los balanceadores de carga por flujo deciden el próximo salto con un hash de los
+primeros bytes del header de transporte, que en ICMP son el tipo, el código y el
+checksum. Cada flujo mantiene constantes el id y el checksum de todos sus
+paquetes (el seq identifica al paquete y dos bytes de payload compensan el
+checksum), así que sigue siempre el mismo camino, y flujos distintos exploran los
+distintos caminos.
+"""
+
+import math
+import struct
+from argparse import ArgumentParser
+from collections import Counter
+from dataclasses import dataclass, field
+from itertools import count
+
+from probing import (
+    IPAddress,
+    Probe,
+    Prober,
+    ProbeReply,
+    RawSocketProber,
+    echo_request_bytes,
+)
+from stats import RunningStats
+from traceroute import MAX_TTL
+
+Node = tuple[int, IPAddress]
+
+# Seqs que se prueban para armar cada paquete de un flujo antes de rendirse
+MAX_SEQ_ATTEMPTS = 16
+
+
+def flow_checksum(flow_id: int) -> int:
+    return flow_id ^ 0x5555
+
+
+def usable_flow_id(flow_id: int) -> bool:
+    """
+    Si el flujo tiene un checksum posible: el checksum de internet nunca es
+    0xFFFF (el complemento a uno de una suma que no puede ser 0x0000).
+    """
+    return flow_checksum(flow_id) != 0xFFFF
+
+
+def ones_complement_add(a: int, b: int) -> int:
+    total = a + b
+    return (total & 0xFFFF) + (total >> 16)
+
+
+def flow_probe(dst_ip: IPAddress, ttl: int, flow_id: int, seq: int) -> Probe | None:
+    """
+    Arma un Probe del flujo flow_id con el seq dado, eligiendo el payload para
+    que el checksum sea el mismo que el de todos los paquetes del flujo.
+
+    Retorna None si con ese seq no se puede (el 0 del complemento a uno tiene dos
+    representaciones), y hay que probar con otro seq. Con los flujos que no son
+    usable_flow_id no se puede con ningún seq.
+    """
+    target_checksum = flow_checksum(flow_id)
+    target_sum = ~target_checksum & 0xFFFF
+
+    header_sum = ones_complement_add(ones_complement_add(0x0800, flow_id), seq)
+    compensation = ones_complement_add(target_sum, ~header_sum & 0xFFFF)
+
+    probe = Probe(dst_ip, ttl, flow_id, seq, struct.pack("!H", compensation))
+    if echo_request_bytes(probe)[2:4] != struct.pack("!H", target_checksum):
+        return None
+    return probe
+
+
+def probes_needed(interfaces: int, alpha: float) -> int:
+    """
+    Cantidad de flujos a probar en un salto en el que se vieron `interfaces`
+    interfaces, para descartar que haya una más con probabilidad 1 - alpha
+    (la regla de corte de MDA).
+    """
+    k = max(interfaces, 1)
+    return math.ceil(math.log(alpha / (k + 1)) / math.log(k / (k + 1)))
+
+
+@dataclass
+class RouteDAG:
+    """
+    Todos los caminos descubiertos hacia un destino.
+
+    Los nodos son (ttl, ip) y hay una arista entre el último nodo que respondió a
+    un flujo y el siguiente, con la cantidad de flujos que la recorrieron.
+    """
+
+    dst_ip: IPAddress
+    nodes: dict[Node, RunningStats] = field(default_factory=dict)
+    edges: Counter[tuple[Node, Node]] = field(default_factory=Counter)
+    probes_sent: int = 0
+
+    def add_reply(self, previous: Node | None, node: Node, rtt: float) -> None:
+        self.nodes.setdefault(node, RunningStats()).add(rtt)
+        if previous is not None:
+            self.edges[(previous, node)] += 1
+
+    def interfaces_at(self, ttl: int) -> list[IPAddress]:
+        return [ip for node_ttl, ip in self.nodes if node_ttl == ttl]
+
+    def successors(self, node: Node) -> list[Node]:
+        return [b for a, b in self.edges if a == node]
+
+    def branching_nodes(self) -> list[Node]:
+        """Los nodos desde los que salen varios caminos (balanceadores)."""
+        return [node for node in self.nodes if len(self.successors(node)) > 1]
+
+    def ttls(self) -> list[int]:
+        return sorted({ttl for ttl, _ in self.nodes})
+
+
+def discover_multipath(
+    dst_ip: IPAddress,
+    prober: Prober,
+    *,
+    alpha: float = 0.05,
+    max_ttl: int = MAX_TTL,
+    timeout: float = 1,
+    max_flows_per_ttl: int = 128,
+) -> RouteDAG:
+    """
+    Enumera los caminos hacia dst_ip salto por salto.
+
+    En cada TTL se prueban flujos hasta que la cantidad de flujos probados alcanza
+    la que pide MDA para la cantidad de interfaces vistas en ese salto (con
+    confianza 1 - alpha), o max_flows_per_ttl. Los flujos se reutilizan entre
+    TTLs para saber qué interfaz precede a cuál; los flujos que no se probaron en
+    el TTL anterior se prueban también ahí. Se corta cuando todos los flujos que respondieron
+    en un TTL llegaron al destino.
+
+    Es la variante por salto de MDA: la regla de corte se aplica a cada TTL y no a
+    cada interfaz del salto anterior.
+    """
+    dag = RouteDAG(dst_ip)
+    flow_ids: list[int] = []
+    seqs = count(1)
+
+    # Último TTL en el que se probó cada flujo y el nodo que respondió (None si
+    # no respondió ninguno)
+    last_ttl: dict[int, int] = {}
+    last_node: dict[int, Node | None] = {}
+
+    def new_flow_id() -> int:
+        while not usable_flow_id(flow_id := prober.new_id()):
+            pass
+        return flow_id
+
+    def send(ttl: int, flows: list[int]) -> list[ProbeReply | None]:
+        probes = []
+        for flow_id in flows:
+            for _ in range(MAX_SEQ_ATTEMPTS):
+                probe = flow_probe(dst_ip, ttl, flow_id, next(seqs) % 2**16)
+                if probe is not None:
+                    break
+            else:
+                raise RuntimeError(
+                    f"No se pudo armar un paquete del flujo {flow_id:#06x}"
+                )
+            probes.append(probe)
+        dag.probes_sent += len(probes)
+        return prober.probe_many(probes, timeout)
+
+    def record(ttl: int, flow_id: int, reply: ProbeReply | None) -> None:
+        # Sólo hay arista si el flujo se probó justo en el TTL anterior
+        previous = last_node[flow_id] if last_ttl.get(flow_id) == ttl - 1 else None
+        node = None
+        if reply is not None:
+            node = (ttl, reply.src)
+            dag.add_reply(previous, node, reply.rtt)
+        last_ttl[flow_id] = ttl
+        last_node[flow_id] = node
+
+    for ttl in range(1, max_ttl + 1):
+        probed = 0
+        reached = True
+
+        while probed < (
+            target := min(
+                probes_needed(len(dag.interfaces_at(ttl)), alpha), max_flows_per_ttl
+            )
+        ):
+            flow_ids += [new_flow_id() for _ in range(target - len(flow_ids))]
+            flows = flow_ids[probed:target]
+
+            # Los flujos que no pasaron por el TTL anterior (los nuevos, y los que
+            # ya existían pero no hicieron falta ahí) se prueban también en él,
+            # para saber de qué interfaz vienen
+            behind = [flow_id for flow_id in flows if last_ttl.get(flow_id) != ttl - 1]
+            if ttl > 1 and behind:
+                for flow_id, reply in zip(behind, send(ttl - 1, behind)):
+                    record(ttl - 1, flow_id, reply)
+
+            for flow_id, reply in zip(flows, send(ttl, flows)):
+                record(ttl, flow_id, reply)
+                if reply is not None:
+                    reached &= reply.reached_destination
+            probed = target
+
+        if reached and dag.interfaces_at(ttl):
+            break
+
+    return dag
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("ip", help="IP destino")
+    parser.add_argument(
+        "--alpha", type=float, default=0.05, help="Probabilidad de perder una interfaz"
+    )
+    parser.add_argument(
+        "--max-ttl", type=int, default=MAX_TTL, help="TTL máximo para traceroute"
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=1, help="Timeout para cada ronda"
+    )
+    args = parser.parse_args()
+
+    with RawSocketProber() as prober:
+        dag = discover_multipath(
+            args.ip,
+            prober,
+            alpha=args.alpha,
+            max_ttl=args.max_ttl,
+            timeout=args.timeout,
+        )
+
+    for ttl in dag.ttls():
+        for ip in dag.interfaces_at(ttl):
+            successors = ", ".join(ip for _, ip in dag.successors((ttl, ip)))
+            print(f"{ttl:3} {ip:15} -> {successors}")
+    print(f"Paquetes enviados: {dag.probes_sent}")
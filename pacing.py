@@ -0,0 +1,146 @@
+"""
+Pacing de los paquetes para no disparar el rate limiting de ICMP de los routers.
+
+Muchos routers responden a lo sumo unos pocos Time-Exceeded por segundo, así que
+mandarles paquetes seguidos produce NoResponse que no son pérdidas reales.
+"""
+
+from collections import deque
+from dataclasses import dataclass
+from time import sleep
+from typing import Hashable
+
+from probing import IPAddress, PendingProbe, Probe, Prober, ProbeReply
+from rate_limit import TokenBucket
+
+
+@dataclass
+class HopPacing:
+    """
+    La tasa a la que se le mandan paquetes a un salto, y qué proporción de ellos
+    suele responder.
+    """
+
+    bucket: TokenBucket
+    response_rate: float | None = None
+
+
+class PacedProber(Prober):
+    """
+    Envuelve a otro Prober para limitar cuántos paquetes por segundo le llegan a
+    cada salto.
+
+    El salto de un Probe es la IP que respondió la última vez a ese (destino, TTL),
+    o el (destino, TTL) mismo si todavía no se sabe. probe_many intercala los
+    Probes de los distintos saltos en vez de mandarlos en orden, y cada salto tiene
+    su token bucket. La tasa de cada salto se adapta como en AIMD: si en una tanda
+    respondió una proporción bastante menor que la habitual se divide por dos, y si
+    no crece de a poco hasta max_rate.
+
+    El PacedProber es dueño del Prober que envuelve, y lo cierra al cerrarse.
+    """
+
+    def __init__(
+        self,
+        prober: Prober,
+        *,
+        per_hop_rate: float = 10,
+        burst: float = 4,
+        min_rate: float = 0.5,
+        max_rate: float | None = None,
+        increase: float = 1,
+        drop_tolerance: float = 0.2,
+        smoothing: float = 0.2,
+    ) -> None:
+        super().__init__()
+        self.prober = prober
+        self.per_hop_rate = per_hop_rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate if max_rate is not None else 4 * per_hop_rate
+        self.increase = increase
+        self.drop_tolerance = drop_tolerance
+        self.smoothing = smoothing
+
+        self.hops: dict[Hashable, HopPacing] = {}
+        self.last_hop: dict[tuple[IPAddress, int], IPAddress] = {}
+
+    def new_id(self) -> int:
+        return self.prober.new_id()
+
+    def hop_of(self, probe: Probe) -> Hashable:
+        return self.last_hop.get((probe.dst, probe.ttl), (probe.dst, probe.ttl))
+
+    def pacing_of(self, hop: Hashable) -> HopPacing:
+        if hop not in self.hops:
+            self.hops[hop] = HopPacing(TokenBucket(self.per_hop_rate, self.burst))
+        return self.hops[hop]
+
+    def submit(self, probe: Probe) -> PendingProbe:
+        self.pacing_of(self.hop_of(probe)).bucket.acquire()
+        return self.prober.submit(probe)
+
+    def probe_many(
+        self, probes: list[Probe], timeout: float
+    ) -> list[ProbeReply | None]:
+        """
+        Envía los Probes de a un salto por vez (round robin), salteando los saltos
+        que no tienen tokens, y espera las respuestas.
+        """
+        queues: dict[Hashable, deque[int]] = {}
+        for i, probe in enumerate(probes):
+            queues.setdefault(self.hop_of(probe), deque()).append(i)
+
+        pending: list[PendingProbe | None] = [None] * len(probes)
+        while queues:
+            sent_any = False
+            for hop in list(queues):
+                if not self.pacing_of(hop).bucket.try_acquire():
+                    continue
+                i = queues[hop].popleft()
+                pending[i] = self.prober.submit(probes[i])
+                sent_any = True
+                if not queues[hop]:
+                    del queues[hop]
+
+            if not sent_any:
+                # Nadie tiene tokens: se espera lo que tarda en llegar el próximo
+                sleep(min(1 / self.pacing_of(hop).bucket.rate for hop in queues))
+
+        return self.wait([p for p in pending if p is not None], timeout)
+
+    def wait(
+        self, pending_probes: list[PendingProbe], timeout: float
+    ) -> list[ProbeReply | None]:
+        # Cada respuesta cuenta para el salto al que se le envió el Probe, que se
+        # calcula antes de que last_hop cambie con las respuestas de esta tanda
+        hops = [self.hop_of(pending.probe) for pending in pending_probes]
+        replies = self.prober.wait(pending_probes, timeout)
+
+        batch: dict[Hashable, list[bool]] = {}
+        for pending, hop, reply in zip(pending_probes, hops, replies):
+            probe = pending.probe
+            batch.setdefault(hop, []).append(reply is not None)
+            if reply is not None and not reply.reached_destination:
+                self.last_hop[(probe.dst, probe.ttl)] = reply.src
+
+        for hop, answered in batch.items():
+            self.adapt(self.pacing_of(hop), sum(answered) / len(answered))
+
+        return replies
+
+    def adapt(self, pacing: HopPacing, response_rate: float) -> None:
+        bucket = pacing.bucket
+        if pacing.response_rate is None:
+            pacing.response_rate = response_rate
+            return
+
+        if response_rate < pacing.response_rate * (1 - self.drop_tolerance):
+            bucket.set_rate(max(self.min_rate, bucket.rate / 2))
+        else:
+            bucket.set_rate(min(self.max_rate, bucket.rate + self.increase))
+
+        pacing.response_rate += self.smoothing * (response_rate - pacing.response_rate)
+
+    def close(self) -> None:
+        self.prober.close()
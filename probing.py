@@ -0,0 +1,263 @@
+import random
+import select
+import socket
+import struct
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from itertools import count
+from threading import Event, Lock, Thread
+from time import monotonic, time_ns
+from typing import Any, TypeVar
+
+IPAddress = str
+
+P = TypeVar("P", bound="Prober")
+
+ICMP_ECHO_REPLY = 0
+ICMP_DESTINATION_UNREACHABLE = 3
+ICMP_ECHO_REQUEST = 8
+ICMP_TIME_EXCEEDED = 11
+
+# No todas las versiones de Python exponen la constante
+SO_TIMESTAMPNS = getattr(socket, "SO_TIMESTAMPNS", 35)
+
+
+@dataclass(frozen=True)
+class Probe:
+    """Un Echo-Request. Las respuestas se asocian por (dst, id, seq)."""
+
+    dst: IPAddress
+    ttl: int
+    id: int
+    seq: int
+    payload: bytes = b""
+
+    @property
+    def key(self) -> tuple[IPAddress, int, int]:
+        return (self.dst, self.id, self.seq)
+
+
+@dataclass(frozen=True)
+class ProbeReply:
+    """La respuesta a un Probe: quién respondió, el RTT y el tipo de ICMP."""
+
+    src: IPAddress
+    rtt: float
+    icmp_type: int
+
+    @property
+    def reached_destination(self) -> bool:
+        return self.icmp_type == ICMP_ECHO_REPLY
+
+
+def internet_checksum(data: bytes) -> int:
+    if len(data) % 2:
+        data += b"\0"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+def echo_request_bytes(probe: Probe) -> bytes:
+    header = struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, 0, probe.id, probe.seq)
+    checksum = internet_checksum(header + probe.payload)
+    return header[:2] + struct.pack("!H", checksum) + header[4:] + probe.payload
+
+
+def parse_icmp_reply(
+    packet: bytes,
+) -> tuple[IPAddress, int, tuple[IPAddress, int, int]] | None:
+    """
+    Retorna (IP que respondió, tipo de ICMP, clave del Probe) de un paquete IP,
+    o None si no es una respuesta a un Echo-Request.
+    """
+    header_length = (packet[0] & 0x0F) * 4
+    src = socket.inet_ntoa(packet[12:16])
+    icmp = packet[header_length:]
+    if len(icmp) < 8:
+        return None
+
+    icmp_type = icmp[0]
+
+    if icmp_type == ICMP_ECHO_REPLY:
+        icmp_id, seq = struct.unpack("!HH", icmp[4:8])
+        return (src, icmp_type, (src, icmp_id, seq))
+
+    if icmp_type in (ICMP_TIME_EXCEEDED, ICMP_DESTINATION_UNREACHABLE):
+        # Los errores traen el header IP y los primeros 8 bytes del paquete original
+        original = icmp[8:]
+        if len(original) < 20:
+            return None
+        original_header_length = (original[0] & 0x0F) * 4
+        original_icmp = original[original_header_length:]
+        if len(original_icmp) < 8 or original_icmp[0] != ICMP_ECHO_REQUEST:
+            return None
+        dst = socket.inet_ntoa(original[16:20])
+        icmp_id, seq = struct.unpack("!HH", original_icmp[4:8])
+        return (src, icmp_type, (dst, icmp_id, seq))
+
+    return None
+
+
+class PendingProbe:
+    def __init__(self, probe: Probe) -> None:
+        self.probe = probe
+        self.sent_time_ns = 0
+        self.sent_monotonic = 0.0
+        self.reply: ProbeReply | None = None
+        self.answered = Event()
+
+
+class Prober(ABC):
+    """
+    Una forma de enviar Echo-Requests y recibir sus respuestas.
+
+    submit envía un Probe sin esperar, y wait espera las respuestas de varios
+    Probes enviados; las funciones de traceroute sólo usan esto (y new_id), así
+    que da igual si los paquetes salen por un socket o a una red simulada.
+    """
+
+    def __init__(self) -> None:
+        # Los sockets raw reciben todos los Echo-Reply del host, así que cada
+        # proceso empieza en un id al azar para no confundir las respuestas de otro
+        self.ids = count(random.randrange(2**16))
+
+    def new_id(self) -> int:
+        """Un id de ICMP que no se usó hace poco, para no confundir respuestas."""
+        return next(self.ids) % 2**16
+
+    @abstractmethod
+    def submit(self, probe: Probe) -> PendingProbe:
+        """Envía el Probe sin esperar la respuesta."""
+        ...
+
+    @abstractmethod
+    def wait(
+        self, pending_probes: list[PendingProbe], timeout: float
+    ) -> list[ProbeReply | None]:
+        """
+        Espera las respuestas hasta timeout segundos después del último envío.
+        """
+        ...
+
+    def probe_many(
+        self, probes: list[Probe], timeout: float
+    ) -> list[ProbeReply | None]:
+        """Envía todos los Probes y espera sus respuestas."""
+        return self.wait([self.submit(probe) for probe in probes], timeout)
+
+    def probe(self, probe: Probe, timeout: float) -> ProbeReply | None:
+        return self.probe_many([probe], timeout)[0]
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self: P) -> P:
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        self.close()
+
+
+class RawSocketProber(Prober):
+    """
+    Envía Echo-Requests y recibe las respuestas por un único socket raw, que
+    queda abierto mientras viva el prober.
+
+    Un thread lee todas las respuestas ICMP y se las entrega al Probe que las
+    generó según (dst, id, seq), así que se pueden tener muchos paquetes en vuelo
+    a la vez. El RTT sale de la marca de tiempo del kernel al recibir
+    (SO_TIMESTAMPNS) menos el momento justo antes del sendto.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.socket = socket.socket(
+            socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP
+        )
+        self.socket.setsockopt(socket.SOL_SOCKET, SO_TIMESTAMPNS, 1)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 2**22)
+
+        self.send_lock = Lock()
+        self.pending_lock = Lock()
+        self.pending: dict[tuple[IPAddress, int, int], PendingProbe] = {}
+
+        self.closed = False
+        self.receiver = Thread(target=self.receive_loop, daemon=True)
+        self.receiver.start()
+
+    def submit(self, probe: Probe) -> PendingProbe:
+        pending = PendingProbe(probe)
+        with self.pending_lock:
+            self.pending[probe.key] = pending
+
+        packet = echo_request_bytes(probe)
+        try:
+            with self.send_lock:
+                self.socket.setsockopt(socket.IPPROTO_IP, socket.IP_TTL, probe.ttl)
+                pending.sent_monotonic = monotonic()
+                pending.sent_time_ns = time_ns()
+                self.socket.sendto(packet, (probe.dst, 0))
+        except OSError:
+            # Nadie va a esperar este Probe, así que no puede quedar pendiente
+            with self.pending_lock:
+                if self.pending.get(probe.key) is pending:
+                    del self.pending[probe.key]
+            raise
+
+        return pending
+
+    def wait(
+        self, pending_probes: list[PendingProbe], timeout: float
+    ) -> list[ProbeReply | None]:
+        deadline = max((p.sent_monotonic for p in pending_probes), default=0) + timeout
+
+        for pending in pending_probes:
+            pending.answered.wait(max(0.0, deadline - monotonic()))
+
+        with self.pending_lock:
+            for pending in pending_probes:
+                if self.pending.get(pending.probe.key) is pending:
+                    del self.pending[pending.probe.key]
+
+        return [pending.reply for pending in pending_probes]
+
+    def receive_loop(self) -> None:
+        while not self.closed:
+            readable, _, _ = select.select([self.socket], [], [], 0.1)
+            if not readable:
+                continue
+
+            try:
+                packet, ancillary_data, _, _ = self.socket.recvmsg(2**16, 2**10)
+            except OSError:
+                break
+
+            received_time_ns = time_ns()
+            for level, kind, data in ancillary_data:
+                if level == socket.SOL_SOCKET and kind == SO_TIMESTAMPNS:
+                    seconds, nanoseconds = struct.unpack("qq", data[:16])
+                    received_time_ns = seconds * 10**9 + nanoseconds
+
+            parsed = parse_icmp_reply(packet)
+            if parsed is None:
+                continue
+            src, icmp_type, key = parsed
+
+            with self.pending_lock:
+                pending = self.pending.get(key)
+            if pending is None or pending.answered.is_set():
+                continue
+
+            pending.reply = ProbeReply(
+                src=src,
+                rtt=(received_time_ns - pending.sent_time_ns) / 1e9,
+                icmp_type=icmp_type,
+            )
+            pending.answered.set()
+
+    def close(self) -> None:
+        self.closed = True
+        self.receiver.join()
+        self.socket.close()
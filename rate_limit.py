@@ -0,0 +1,55 @@
+from threading import Lock
+from time import monotonic, sleep
+
+
+class TokenBucket:
+    """
+    Limita la tasa de algo a rate por segundo, permitiendo ráfagas de hasta
+    capacity. Se puede compartir entre threads.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None) -> None:
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self.tokens = self.capacity
+        self.last_refill = monotonic()
+        self.lock = Lock()
+
+    def refill(self) -> None:
+        now = monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.last_refill) * self.rate
+        )
+        self.last_refill = now
+
+    def try_acquire(self, tokens: float = 1) -> bool:
+        """Consume tokens si hay suficientes, sin esperar."""
+        with self.lock:
+            self.refill()
+            if self.tokens < tokens:
+                return False
+            self.tokens -= tokens
+            return True
+
+    def acquire(self, tokens: float = 1) -> None:
+        """Espera hasta que haya tokens suficientes y los consume."""
+        # Nunca se juntan más de capacity tokens, así que se esperaría para siempre
+        if tokens > self.capacity:
+            raise ValueError(
+                f"Se pidieron {tokens} tokens y el bucket tiene {self.capacity}"
+            )
+
+        while True:
+            with self.lock:
+                self.refill()
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                missing = tokens - self.tokens
+
+            sleep(missing / self.rate)
+
+    def set_rate(self, rate: float) -> None:
+        with self.lock:
+            self.refill()
+            self.rate = rate
@@ -0,0 +1,174 @@
+import math
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Iterable
+
+from stats import RunningStats
+from traceroute import IPAddress, NoResponse, RouterResponse, TTLRoute
+
+
+class LatencyHistogram:
+    """
+    Histograma de tiempos con bins de ancho logarítmico fijos, así que ocupa
+    siempre la misma memoria sin importar cuántos valores se agreguen.
+
+    Los bins van de min_time a max_time segundos; los valores fuera de ese rango
+    caen en el primer o el último bin.
+    """
+
+    def __init__(
+        self, min_time: float = 1e-5, max_time: float = 10.0, bins: int = 96
+    ) -> None:
+        self.min_time = min_time
+        self.bins_per_e = bins / math.log(max_time / min_time)
+        self.counts = [0] * bins
+
+    def bin_of(self, value: float) -> int:
+        if value <= self.min_time:
+            return 0
+        i = int(math.log(value / self.min_time) * self.bins_per_e)
+        return min(i, len(self.counts) - 1)
+
+    def bin_edges(self, i: int) -> tuple[float, float]:
+        return (
+            self.min_time * math.exp(i / self.bins_per_e),
+            self.min_time * math.exp((i + 1) / self.bins_per_e),
+        )
+
+    def add(self, value: float) -> None:
+        self.counts[self.bin_of(value)] += 1
+
+    def quantile(self, q: float) -> float:
+        """
+        Aproxima el cuantil q (entre 0 y 1) con el centro geométrico de su bin.
+        """
+        total = sum(self.counts)
+        if total == 0:
+            return float("nan")
+
+        accumulated = 0
+        for i, count in enumerate(self.counts):
+            accumulated += count
+            if accumulated >= q * total:
+                low, high = self.bin_edges(i)
+                return math.sqrt(low * high)
+
+        return self.bin_edges(len(self.counts) - 1)[1]
+
+
+@dataclass
+class EdgeStats:
+    """
+    Lo que se sabe de un enlace: cuántas veces se lo atravesó y la distribución
+    de su segment_time.
+    """
+
+    segment_time: RunningStats = field(default_factory=RunningStats)
+    histogram: LatencyHistogram = field(default_factory=LatencyHistogram)
+    count: int = 0
+
+    def add(self, segment_time: float) -> None:
+        self.count += 1
+        # Los segment_time en 0 son los TTLs negativos, no dicen nada del enlace
+        if segment_time > 0:
+            self.segment_time.add(segment_time)
+            self.histogram.add(segment_time)
+
+
+class RouteGraph:
+    """
+    Grafo con todas las rutas medidas hacia un destino.
+
+    Los nodos son IPs y las aristas unen respuestas consecutivas de una misma ruta
+    (salteando los NoResponse). Se actualiza de a una ruta con add_route, y las
+    estadísticas de cada nodo y arista se calculan sobre la marcha, así que la
+    memoria no crece con la cantidad de rutas.
+    """
+
+    def __init__(self) -> None:
+        self.routes = 0
+        self.ips_per_ttl: dict[int, Counter[IPAddress]] = {}
+        self.rtt_times: dict[IPAddress, RunningStats] = {}
+        self.edges: dict[tuple[IPAddress, IPAddress], EdgeStats] = {}
+        self.successors_of: dict[IPAddress, set[IPAddress]] = {}
+        self.reached_lengths: Counter[int] = Counter()
+
+    @staticmethod
+    def from_samples(route_samples: Iterable[TTLRoute]) -> "RouteGraph":
+        graph = RouteGraph()
+        for route in route_samples:
+            graph.add_route(route)
+        return graph
+
+    def add_route(self, route: TTLRoute) -> None:
+        self.routes += 1
+        if route and not isinstance(route[-1], NoResponse):
+            self.reached_lengths[len(route)] += 1
+
+        previous_ip: IPAddress | None = None
+        for response in route:
+            if not isinstance(response, RouterResponse):
+                continue
+
+            self.ips_per_ttl.setdefault(response.ttl, Counter())[response.ip] += 1
+            self.rtt_times.setdefault(response.ip, RunningStats()).add(
+                response.rtt_time
+            )
+
+            if previous_ip is not None and previous_ip != response.ip:
+                self.edges.setdefault((previous_ip, response.ip), EdgeStats()).add(
+                    response.get_segment_time()
+                )
+                self.successors_of.setdefault(previous_ip, set()).add(response.ip)
+
+            previous_ip = response.ip
+
+    def nodes(self) -> list[IPAddress]:
+        return list(self.rtt_times)
+
+    def successors(self, ip: IPAddress) -> list[IPAddress]:
+        return sorted(self.successors_of.get(ip, ()))
+
+    def edge_stats(self, from_ip: IPAddress, to_ip: IPAddress) -> EdgeStats:
+        return self.edges[(from_ip, to_ip)]
+
+    def branching_nodes(self) -> list[IPAddress]:
+        """Las IPs desde las que salen enlaces hacia más de una IP."""
+        return [
+            ip for ip, successors in self.successors_of.items() if len(successors) > 1
+        ]
+
+    def modal_path(self) -> TTLRoute:
+        """
+        Retorna la ruta con la IP más frecuente de cada TTL, hasta el largo más
+        frecuente entre las rutas que llegaron al destino.
+
+        Es el análogo a stats.average_route, pero el RTT de cada salto es el de
+        todas las respuestas de esa IP, y el segment_time el del enlace desde el
+        salto anterior, sin descartar las rutas de otros largos.
+        """
+        if self.reached_lengths:
+            length, _ = self.reached_lengths.most_common(1)[0]
+        else:
+            length = max(self.ips_per_ttl, default=-1) + 1
+
+        path: TTLRoute = []
+        previous_ip: IPAddress | None = None
+        for ttl in range(length):
+            if ttl not in self.ips_per_ttl:
+                path.append(NoResponse(ttl=ttl))
+                continue
+
+            ip, _ = self.ips_per_ttl[ttl].most_common(1)[0]
+            edge = self.edges.get((previous_ip, ip)) if previous_ip else None
+            path.append(
+                RouterResponse(
+                    ttl=ttl,
+                    ip=ip,
+                    segment_time=edge.segment_time.mean if edge else 0,
+                    rtt_time=self.rtt_times[ip].mean,
+                )
+            )
+            previous_ip = ip
+
+        return path
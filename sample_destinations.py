@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Muestrea las rutas a varios destinos a la vez desde un único proceso.
+
+Los destinos se pasan como nombre=ip (o sólo la ip) o en un archivo con un
+destino por línea ("nombre ip" o "ip"). Las muestras de cada destino se guardan
+en <output-dir>/<nombre>.samples.
+"""
+
+from argparse import ArgumentParser
+from contextlib import ExitStack
+from pathlib import Path
+
+from doubletree import iter_many_routes_doubletree
+from metrics import add_instrumentation_arguments, instrumented
+from traceroute import (
+    MAX_TTL,
+    SAMPLES_PER_TTL,
+    IPAddress,
+    iter_many_routes,
+    prober_from_args,
+    SampleWriter,
+)
+
+
+def parse_destination(destination: str) -> tuple[str, IPAddress]:
+    name, _, ip = destination.rpartition("=")
+    return (name or ip, ip)
+
+
+def load_destinations(path: str) -> dict[str, IPAddress]:
+    """
+    Lee un archivo de destinos. Se ignoran las líneas vacías y los comentarios.
+    """
+    destinations: dict[str, IPAddress] = {}
+
+    with open(path, "r") as destinations_file:
+        for line in destinations_file:
+            fields = line.split("#", 1)[0].split()
+            if not fields:
+                continue
+            ip = fields[-1]
+            destinations[fields[0] if len(fields) > 1 else ip] = ip
+
+    return destinations
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument(
+        "destinations", nargs="*", help="Destinos, como nombre=ip o sólo ip"
+    )
+    parser.add_argument(
+        "--destinations-file",
+        type=str,
+        default=None,
+        help="Archivo con un destino por línea",
+    )
+    parser.add_argument(
+        "--samples", type=int, default=SAMPLES_PER_TTL, help="Cantidad de muestras"
+    )
+    parser.add_argument(
+        "--max-ttl", type=int, default=MAX_TTL, help="TTL máximo para traceroute"
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=1, help="Timeout para cada ronda"
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=2**12,
+        help="Cantidad máxima de paquetes enviados en cada tanda",
+    )
+    parser.add_argument(
+        "--raw-socket",
+        action="store_true",
+        default=False,
+        help="Enviar todos los paquetes por un único socket raw en vez de usar scapy",
+    )
+    parser.add_argument(
+        "--per-hop-rate",
+        type=float,
+        default=None,
+        help="Paquetes por segundo a cada salto (con --raw-socket)",
+    )
+    parser.add_argument(
+        "--doubletree-start-ttl",
+        type=int,
+        default=None,
+        help="Empezar cada traza en este TTL y no volver a medir saltos conocidos",
+    )
+    parser.add_argument(
+        "--output-dir",
+        type=str,
+        default="samples",
+        help="Directorio donde guardar los samples",
+    )
+    parser.add_argument(
+        "--append",
+        action="store_true",
+        default=False,
+        help="Agregar los samples al final de los archivos en vez de reemplazarlos",
+    )
+    add_instrumentation_arguments(parser)
+
+    args = parser.parse_args()
+
+    destinations = dict(map(parse_destination, args.destinations))
+    if args.destinations_file is not None:
+        destinations.update(load_destinations(args.destinations_file))
+
+    if not destinations:
+        parser.error("No se indicó ningún destino")
+
+    with ExitStack() as stack:
+        stack.enter_context(instrumented(args.metrics, args.profile))
+        prober = prober_from_args(args)
+        if prober is not None:
+            stack.enter_context(prober)
+        outputs = {
+            ip: stack.enter_context(
+                SampleWriter(
+                    str(Path(args.output_dir) / f"{name}.samples"), append=args.append
+                )
+            )
+            for name, ip in destinations.items()
+        }
+
+        if args.doubletree_start_ttl is not None:
+            routes = iter_many_routes_doubletree(
+                destinations.values(),
+                samples_per_ttl=args.samples,
+                start_ttl=args.doubletree_start_ttl,
+                max_ttl=args.max_ttl,
+                timeout=args.timeout,
+                batch_size=args.batch_size,
+                prober=prober,
+                outputs=outputs,
+            )
+        else:
+            routes = iter_many_routes(
+                destinations.values(),
+                samples_per_ttl=args.samples,
+                max_ttl=args.max_ttl,
+                timeout=args.timeout,
+                batch_size=args.batch_size,
+                prober=prober,
+                outputs=outputs,
+            )
+
+        # Las rutas sólo se guardan en los archivos, no en memoria
+        for _ in routes:
+            pass
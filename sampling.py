@@ -0,0 +1,276 @@
+from collections import Counter
+from contextlib import ExitStack
+from dataclasses import dataclass, field
+from pprint import pprint
+
+from tqdm import tqdm
+
+from metrics import instrumented
+from multipath import probes_needed
+from probing import Prober
+from stats import RunningStats
+from traceroute import (
+    MAX_TTL,
+    SAMPLES_PER_TTL,
+    IPAddress,
+    NoResponse,
+    RouteResponse,
+    RouterResponse,
+    RouteSamples,
+    SampleWriter,
+    TTLRoute,
+    parallel_echo_requests,
+    prober_from_args,
+    route_from_replies,
+    sample_routes,
+    traceroute,
+    traceroute_parser,
+)
+
+
+@dataclass
+class TTLStatistics:
+    """
+    Lo que se sabe de un TTL hasta el momento: el RTT de las respuestas y qué IPs
+    respondieron.
+    """
+
+    rtt_time: RunningStats = field(default_factory=RunningStats)
+    ips: Counter[IPAddress] = field(default_factory=Counter)
+    no_responses: int = 0
+
+    def add(self, response: RouteResponse) -> None:
+        if not isinstance(response, RouterResponse):
+            self.no_responses += 1
+            return
+
+        self.rtt_time.add(response.rtt_time)
+        self.ips[response.ip] += 1
+
+    def has_converged(self, max_ci_width: float, confidence: float) -> bool:
+        # Un router que nunca respondió no va a converger nunca
+        if not self.ips:
+            return True
+
+        # Las IPs se asentaron cuando hay respuestas suficientes para descartar,
+        # con esa confianza, que haya una más (la regla de corte de MDA). Con
+        # balanceo de carga la IP más frecuente cambia seguido, pero el conjunto
+        # de IPs deja de crecer.
+        return (
+            self.ips.total() >= probes_needed(len(self.ips), 1 - confidence)
+            and self.rtt_time.confidence_interval_width(confidence) <= max_ci_width
+        )
+
+
+def sample_routes_adaptively(
+    dst_ip: IPAddress,
+    *,
+    max_ci_width: float,
+    min_samples: int = 4,
+    max_samples: int = SAMPLES_PER_TTL,
+    confidence: float = 0.95,
+    max_ttl: int = MAX_TTL,
+    timeout: float = 1,
+    parallel: bool = False,
+    output: SampleWriter | None = None,
+    prober: Prober | None = None,
+) -> RouteSamples:
+    """
+    Como sample_routes, pero deja de medir cuando las estadísticas convergieron.
+
+    Después de cada ruta se actualizan las estadísticas de cada TTL, y se corta
+    cuando en todos los TTLs el intervalo de confianza del RTT mide a lo sumo
+    max_ci_width segundos y hay respuestas suficientes para descartar, con la
+    misma confianza, que el TTL tenga IPs que todavía no se vieron. Siempre se
+    miden entre min_samples y max_samples rutas.
+    """
+    routes: RouteSamples = []
+    ttl_statistics: dict[int, TTLStatistics] = {}
+
+    for _ in tqdm(range(max_samples), desc="Midiendo rutas"):
+        route = traceroute(
+            dst_ip,
+            max_ttl=max_ttl,
+            timeout=timeout,
+            parallel=parallel,
+            prober=prober,
+        )
+        routes.append(route)
+        if output is not None:
+            output.write(route)
+
+        for response in route:
+            ttl_statistics.setdefault(response.ttl, TTLStatistics()).add(response)
+
+        if len(routes) >= min_samples and all(
+            statistics.has_converged(max_ci_width, confidence)
+            for statistics in ttl_statistics.values()
+        ):
+            break
+
+    return routes
+
+
+def with_recomputed_segment_times(dst_ip: IPAddress, route: TTLRoute) -> TTLRoute:
+    """Recalcula los segment_time de una ruta a la que se le cambiaron respuestas."""
+    return (
+        route[:1]
+        + route_from_replies(
+            dst_ip,
+            (
+                (response.ttl, response.ip, response.rtt_time)
+                if isinstance(response, RouterResponse)
+                else (response.ttl, None, 0.0)
+                for response in route[1:]
+            ),
+        )[1:]
+    )
+
+
+def fill_missing_hops(
+    dst_ip: IPAddress,
+    samples: RouteSamples,
+    *,
+    budget_per_ttl: int = 8,
+    timeout: float = 1,
+    prober: Prober | None = None,
+) -> RouteSamples:
+    """
+    Vuelve a medir sólo los TTLs que tienen NoResponse en alguna muestra, en vez
+    de medir rutas enteras de nuevo.
+
+    En cada ronda se envía en paralelo un paquete por cada TTL al que le faltan
+    respuestas, hasta budget_per_ttl paquetes por TTL. Cada respuesta reemplaza
+    al primer NoResponse de ese TTL, y después se recalculan los segment_time de
+    las rutas que cambiaron. Las muestras originales no se modifican.
+
+    Si el que responde es el destino, la ruta termina ahí como en traceroute: se
+    descartan sus TTLs siguientes, que ya no se vuelven a medir.
+    """
+    samples = [list(route) for route in samples]
+
+    # Estado de cada TTL: qué muestras no tienen respuesta, y cuántos paquetes
+    # quedan por mandar
+    missing: dict[int, list[int]] = {}
+    for i, route in enumerate(samples):
+        for response in route:
+            if isinstance(response, NoResponse):
+                missing.setdefault(response.ttl, []).append(i)
+    budget = {ttl: budget_per_ttl for ttl in missing}
+
+    changed_routes: set[int] = set()
+    with tqdm(total=sum(map(len, missing.values())), desc="Rellenando TTLs") as bar:
+        while pending_ttls := [ttl for ttl in missing if missing[ttl] and budget[ttl]]:
+            replies = parallel_echo_requests(
+                dst_ip, pending_ttls, timeout, prober=prober
+            )
+
+            for ttl in pending_ttls:
+                budget[ttl] -= 1
+                # Las rutas que faltaban pueden haber terminado antes en esta ronda
+                if ttl not in replies or not missing[ttl]:
+                    continue
+
+                ip, rtt = replies[ttl]
+                i = missing[ttl].pop(0)
+                samples[i][ttl] = RouterResponse(
+                    ttl=ttl, ip=ip, segment_time=0, rtt_time=rtt
+                )
+                changed_routes.add(i)
+                bar.update()
+
+                if ip == dst_ip:
+                    del samples[i][ttl + 1 :]
+                    for later_ttl, routes in missing.items():
+                        if later_ttl > ttl and i in routes:
+                            routes.remove(i)
+                            bar.total -= 1
+
+    for i in changed_routes:
+        samples[i] = with_recomputed_segment_times(dst_ip, samples[i])
+
+    return samples
+
+
+if __name__ == "__main__":
+    traceroute_parser.add_argument(
+        "--max-ci-width",
+        type=float,
+        default=None,
+        help="Ancho máximo del intervalo de confianza del RTT (en segundos)",
+    )
+    traceroute_parser.add_argument(
+        "--min-samples", type=int, default=4, help="Cantidad mínima de muestras"
+    )
+    traceroute_parser.add_argument(
+        "--output",
+        type=str,
+        default=None,
+        help="Path a donde guardar los samples",
+    )
+    traceroute_parser.add_argument(
+        "--append",
+        action="store_true",
+        default=False,
+        help="Agregar los samples al final de --output en vez de reemplazarlo",
+    )
+    traceroute_parser.add_argument(
+        "--reprobe-budget",
+        type=int,
+        default=0,
+        help="Paquetes extra por TTL para rellenar los NoResponse",
+    )
+
+    args = traceroute_parser.parse_args()
+
+    with ExitStack() as stack:
+        stack.enter_context(instrumented(args.metrics, args.profile))
+        writer = (
+            stack.enter_context(SampleWriter(args.output, append=args.append))
+            if args.output
+            else None
+        )
+        # Donde empiezan las rutas de esta corrida, por si hay que reescribirlas
+        start_offset = writer.file.tell() if writer is not None else 0
+        prober = prober_from_args(args)
+        if prober is not None:
+            stack.enter_context(prober)
+
+        if args.max_ci_width is not None:
+            samples = sample_routes_adaptively(
+                args.ip,
+                max_ci_width=args.max_ci_width,
+                min_samples=args.min_samples,
+                max_samples=args.samples,
+                max_ttl=args.max_ttl,
+                timeout=args.timeout,
+                parallel=args.parallel,
+                output=writer,
+                prober=prober,
+            )
+        else:
+            samples = sample_routes(
+                args.ip,
+                samples_per_ttl=args.samples,
+                max_ttl=args.max_ttl,
+                timeout=args.timeout,
+                parallel=args.parallel,
+                output=writer,
+                prober=prober,
+            )
+
+        if args.reprobe_budget > 0:
+            samples = fill_missing_hops(
+                args.ip,
+                samples,
+                budget_per_ttl=args.reprobe_budget,
+                timeout=args.timeout,
+                prober=prober,
+            )
+            if writer is not None:
+                writer.file.seek(start_offset)
+                writer.file.truncate()
+                for route in samples:
+                    writer.write(route)
+
+    pprint(samples)
@@ -0,0 +1,348 @@
+"""
+Una red simulada para probar y medir traceroute sin permisos de root ni red.
+
+SimulatedProber implementa Prober, así que se le puede pasar a traceroute,
+sample_routes, sample_many_routes, etc. en lugar de un RawSocketProber.
+"""
+
+import heapq
+import random
+import zlib
+from argparse import ArgumentParser
+from dataclasses import dataclass, field
+from itertools import count
+from threading import Condition, Thread
+from time import monotonic, perf_counter, time_ns
+
+from probing import (
+    ICMP_ECHO_REPLY,
+    ICMP_TIME_EXCEEDED,
+    IPAddress,
+    PendingProbe,
+    Probe,
+    Prober,
+    ProbeReply,
+    echo_request_bytes,
+)
+from rate_limit import TokenBucket
+
+# El nodo desde el que salen todos los paquetes
+SOURCE = "source"
+
+
+@dataclass
+class SimulatedLink:
+    """
+    Un enlace con latencia latency más una demora de cola exponencial de media
+    jitter (en segundos) en cada sentido, que pierde paquetes con probabilidad
+    loss_rate.
+    """
+
+    latency: float = 0.005
+    jitter: float = 0.001
+    loss_rate: float = 0.0
+
+    def sample_latency(self, rng: random.Random) -> float:
+        if self.jitter <= 0:
+            return self.latency
+        return self.latency + rng.expovariate(1 / self.jitter)
+
+
+@dataclass
+class SimulatedNetwork:
+    """
+    La topología: para cada destino, los próximos saltos posibles desde cada nodo.
+
+    Cuando un nodo tiene varios próximos saltos, el paquete elige uno según un
+    hash del flujo (destino, tipo, código y checksum de ICMP), como un balanceador
+    por flujo, o al azar si per_packet_balancing.
+
+    Si se indica icmp_rate, cada router manda a lo sumo esa cantidad de
+    Time-Exceeded por segundo (en tiempo real), con ráfagas de hasta icmp_burst.
+    """
+
+    seed: int = 0
+    per_packet_balancing: bool = False
+    next_hops: dict[IPAddress, dict[str, list[IPAddress]]] = field(default_factory=dict)
+    links: dict[tuple[str, IPAddress], SimulatedLink] = field(default_factory=dict)
+    silent_routers: set[IPAddress] = field(default_factory=set)
+    icmp_rate: float | None = None
+    icmp_burst: float = 4
+
+    def __post_init__(self) -> None:
+        self.rng = random.Random(self.seed)
+        self.icmp_buckets: dict[IPAddress, TokenBucket] = {}
+
+    def icmp_allowed(self, router: IPAddress) -> bool:
+        if self.icmp_rate is None:
+            return True
+        if router not in self.icmp_buckets:
+            self.icmp_buckets[router] = TokenBucket(self.icmp_rate, self.icmp_burst)
+        return self.icmp_buckets[router].try_acquire()
+
+    def add_route(
+        self,
+        dst_ip: IPAddress,
+        hops: list[IPAddress | list[IPAddress]],
+        **link_parameters: float,
+    ) -> None:
+        """
+        Agrega los caminos hacia dst_ip. Cada elemento de hops es un salto, y una
+        lista de IPs es un salto balanceado: todas las IPs de un salto se conectan
+        con todas las del siguiente. El último salto tiene que ser dst_ip.
+        """
+        stages = [[SOURCE]] + [[hop] if isinstance(hop, str) else hop for hop in hops]
+        assert stages[-1] == [dst_ip]
+
+        routes = self.next_hops.setdefault(dst_ip, {})
+        for current_stage, next_stage in zip(stages, stages[1:]):
+            for node in current_stage:
+                next_hops = routes.setdefault(node, [])
+                for next_hop in next_stage:
+                    if next_hop not in next_hops:
+                        next_hops.append(next_hop)
+                    self.links.setdefault(
+                        (node, next_hop), SimulatedLink(**link_parameters)
+                    )
+
+    def choose_next_hop(
+        self, node: str, next_hops: list[IPAddress], flow: bytes
+    ) -> IPAddress:
+        if len(next_hops) == 1:
+            return next_hops[0]
+        if self.per_packet_balancing:
+            return self.rng.choice(next_hops)
+        return next_hops[zlib.crc32(flow + node.encode()) % len(next_hops)]
+
+    def reply_to(self, probe: Probe) -> ProbeReply | None:
+        """
+        Sigue al Probe salto por salto y retorna la respuesta que generaría, o
+        None si se pierde o el router que la tendría que mandar no responde.
+        """
+        routes = self.next_hops.get(probe.dst)
+        if routes is None:
+            return None
+
+        flow = probe.dst.encode() + echo_request_bytes(probe)[:4]
+        node = SOURCE
+        rtt = 0.0
+
+        for _ in range(probe.ttl):
+            next_hops = routes.get(node)
+            if not next_hops:
+                return None
+
+            next_hop = self.choose_next_hop(node, next_hops, flow)
+            link = self.links[(node, next_hop)]
+            # El paquete y la respuesta pasan una vez por el enlace cada uno
+            for _ in range(2):
+                if self.rng.random() < link.loss_rate:
+                    return None
+                rtt += link.sample_latency(self.rng)
+            node = next_hop
+
+            if node == probe.dst:
+                return ProbeReply(src=node, rtt=rtt, icmp_type=ICMP_ECHO_REPLY)
+
+        if node in self.silent_routers or not self.icmp_allowed(node):
+            return None
+        return ProbeReply(src=node, rtt=rtt, icmp_type=ICMP_TIME_EXCEEDED)
+
+
+def random_network(
+    destinations: int,
+    *,
+    hops: int = 16,
+    load_balanced_hops: int = 2,
+    width: int = 2,
+    loss_rate: float = 0.0,
+    silent_rate: float = 0.0,
+    seed: int = 0,
+) -> tuple[SimulatedNetwork, list[IPAddress]]:
+    """
+    Una red con destinations destinos a hops saltos, que comparten los primeros
+    saltos (como el acceso de un ISP). En cada ruta hay load_balanced_hops saltos
+    con width routers en paralelo, y cada router no responde Time-Exceeded con
+    probabilidad silent_rate.
+    """
+    rng = random.Random(seed)
+    network = SimulatedNetwork(seed=seed)
+    shared = [f"10.0.0.{hop + 1}" for hop in range(min(3, hops))]
+    dst_ips = []
+
+    for destination in range(destinations):
+        dst_ip = f"198.18.{destination // 256}.{destination % 256}"
+        dst_ips.append(dst_ip)
+
+        balanced = set(rng.sample(range(len(shared), hops), load_balanced_hops))
+        route: list[IPAddress | list[IPAddress]] = list(shared)
+        for hop in range(len(shared), hops):
+            prefix = f"10.{1 + destination % 250}.{hop}"
+            if hop in balanced:
+                route.append([f"{prefix}.{i + 1}" for i in range(width)])
+            else:
+                route.append(f"{prefix}.1")
+        route.append(dst_ip)
+
+        network.add_route(
+            dst_ip,
+            route,
+            latency=rng.uniform(0.0005, 0.01),
+            jitter=rng.uniform(0.0001, 0.002),
+            loss_rate=loss_rate,
+        )
+
+    routers = {node for node, _ in network.links} - {SOURCE}
+    network.silent_routers = {
+        router for router in sorted(routers) if rng.random() < silent_rate
+    } - set(dst_ips)
+
+    return network, dst_ips
+
+
+class SimulatedProber(Prober):
+    """
+    Un Prober que en vez de enviar paquetes se los pasa a una SimulatedNetwork.
+
+    Con realtime, cada respuesta llega después de su RTT, como con un socket. Si
+    no, el tiempo es virtual: wait no espera, las respuestas con RTT mayor al
+    timeout se descartan, y clock acumula el tiempo que se habría esperado.
+    """
+
+    def __init__(self, network: SimulatedNetwork, realtime: bool = False) -> None:
+        super().__init__()
+        self.network = network
+        self.realtime = realtime
+        self.clock = 0.0
+        self.probes_sent = 0
+
+        # Respuestas por entregar: (momento de llegada, desempate, pendiente, respuesta)
+        self.deliveries: list[tuple[float, int, PendingProbe, ProbeReply]] = []
+        self.tiebreaker = count()
+        self.delivery_condition = Condition()
+        self.closed = False
+
+        if realtime:
+            self.deliverer = Thread(target=self.delivery_loop, daemon=True)
+            self.deliverer.start()
+
+    def submit(self, probe: Probe) -> PendingProbe:
+        pending = PendingProbe(probe)
+        pending.sent_monotonic = monotonic()
+        pending.sent_time_ns = time_ns()
+        self.probes_sent += 1
+
+        reply = self.network.reply_to(probe)
+        if reply is None:
+            return pending
+
+        if not self.realtime:
+            pending.reply = reply
+            pending.answered.set()
+            return pending
+
+        with self.delivery_condition:
+            heapq.heappush(
+                self.deliveries,
+                (
+                    pending.sent_monotonic + reply.rtt,
+                    next(self.tiebreaker),
+                    pending,
+                    reply,
+                ),
+            )
+            self.delivery_condition.notify()
+
+        return pending
+
+    def wait(
+        self, pending_probes: list[PendingProbe], timeout: float
+    ) -> list[ProbeReply | None]:
+        if self.realtime:
+            deadline = (
+                max((p.sent_monotonic for p in pending_probes), default=0) + timeout
+            )
+            for pending in pending_probes:
+                pending.answered.wait(max(0.0, deadline - monotonic()))
+            return [pending.reply for pending in pending_probes]
+
+        replies = [
+            pending.reply
+            if pending.reply is not None and pending.reply.rtt <= timeout
+            else None
+            for pending in pending_probes
+        ]
+        # Se espera hasta la última respuesta, o el timeout si falta alguna
+        self.clock += (
+            timeout
+            if None in replies
+            else max((reply.rtt for reply in replies if reply), default=0.0)
+        )
+        return replies
+
+    def delivery_loop(self) -> None:
+        with self.delivery_condition:
+            while not self.closed:
+                if not self.deliveries:
+                    self.delivery_condition.wait()
+                    continue
+
+                arrival, _, pending, reply = self.deliveries[0]
+                if arrival > monotonic():
+                    self.delivery_condition.wait(arrival - monotonic())
+                    continue
+
+                heapq.heappop(self.deliveries)
+                pending.reply = reply
+                pending.answered.set()
+
+    def close(self) -> None:
+        if self.realtime:
+            with self.delivery_condition:
+                self.closed = True
+                self.delivery_condition.notify()
+            self.deliverer.join()
+
+
+if __name__ == "__main__":
+    from traceroute import sample_many_routes
+
+    parser = ArgumentParser(
+        description="Mide cuántos paquetes por segundo se procesan en una red simulada"
+    )
+    parser.add_argument("--destinations", type=int, default=64)
+    parser.add_argument("--samples", type=int, default=8, help="Rutas por destino")
+    parser.add_argument("--hops", type=int, default=16)
+    parser.add_argument("--loss-rate", type=float, default=0.01)
+    parser.add_argument("--silent-rate", type=float, default=0.05)
+    parser.add_argument("--timeout", type=float, default=0.5)
+    parser.add_argument(
+        "--realtime", action="store_true", help="Esperar los RTTs de verdad"
+    )
+    args = parser.parse_args()
+
+    network, dst_ips = random_network(
+        args.destinations,
+        hops=args.hops,
+        loss_rate=args.loss_rate,
+        silent_rate=args.silent_rate,
+    )
+
+    with SimulatedProber(network, realtime=args.realtime) as prober:
+        start = perf_counter()
+        samples = sample_many_routes(
+            dst_ips,
+            samples_per_ttl=args.samples,
+            max_ttl=args.hops + 4,
+            timeout=args.timeout,
+            prober=prober,
+        )
+        elapsed = perf_counter() - start
+
+    routes = sum(map(len, samples.values()))
+    print(f"Rutas: {routes}, paquetes: {prober.probes_sent}")
+    print(
+        f"Tiempo real: {elapsed:.2f}s ({prober.probes_sent / elapsed:.0f} paquetes/s)"
+    )
+    if not args.realtime:
+        print(f"Tiempo simulado: {prober.clock:.2f}s")
@@ -1,9 +1,9 @@
 from collections import Counter
+from typing import Iterable
 
 import numpy as np
-import scipy.stats as stats
 
-from traceroute import NoResponse, RouterResponse, RouteSamples, TTLRoute
+from traceroute import IPAddress, NoResponse, RouterResponse, RouteSamples, TTLRoute
 
 
 def filter_only_responses(route: TTLRoute) -> list[RouterResponse]:
@@ -27,71 +27,69 @@ def router_response_count(route: TTLRoute) -> int:
     return len(filter_only_responses(route))
 
 
-def average_length(route_samples: RouteSamples) -> float:
+def average_length(route_samples: Iterable[TTLRoute]) -> float:
     """
     Retorna el largo promedio de una lista de rutas (sin contar los NoResponse).
+
+    Recorre las rutas una sola vez, así que sirve con iter_samples.
     """
-    return sum(router_response_count(route) for route in route_samples) / len(
-        route_samples
-    )
+    total_length = 0
+    number_of_routes = 0
+
+    for route in route_samples:
+        total_length += router_response_count(route)
+        number_of_routes += 1
 
+    return total_length / number_of_routes
 
-def average_route(route_samples: RouteSamples) -> TTLRoute:
+
+def average_route(route_samples: Iterable[TTLRoute]) -> TTLRoute:
     """
     Retorna la ruta promedio de una lista de rutas.
 
     La ruta promedio es una lista de RouterResponse, donde cada RouterResponse
     tiene como ip la ip más frecuente de las respuestas para ese TTL, y como
     segment_time el promedio de los segment_time de las respuestas para esa IP.
+
+    Recorre las rutas una sola vez y sólo guarda sumas por largo, TTL e IP, así
+    que sirve con iter_samples.
     """
-    average_route: TTLRoute = []
+    complete_lengths: Counter[int] = Counter()
+    # Por largo de ruta, TTL e IP: [cantidad, suma de segment_time, suma de rtt_time]
+    totals: dict[int, list[dict[IPAddress, list[float]]]] = {}
+
+    for route in route_samples:
+        if not isinstance(route[-1], NoResponse):
+            complete_lengths[len(route)] += 1
 
-    most_common_length, _ = Counter(
-        len(route) for route in route_samples if not isinstance(route[-1], NoResponse)
-    ).most_common(1)[0]
+        ttl_totals = totals.setdefault(len(route), [{} for _ in route])
+        for response, ip_totals in zip(route, ttl_totals):
+            if isinstance(response, RouterResponse):
+                ip_total = ip_totals.setdefault(response.ip, [0, 0.0, 0.0])
+                ip_total[0] += 1
+                ip_total[1] += response.get_segment_time()
+                ip_total[2] += response.rtt_time
 
     # Nos quedamos solo con las rutas de la misma distancia
-    route_samples = [
-        route for route in route_samples if len(route) == most_common_length
-    ]
+    most_common_length, _ = complete_lengths.most_common(1)[0]
 
-    for ttl, ttl_responses in enumerate(zip(*route_samples)):
-        if all(isinstance(response, NoResponse) for response in ttl_responses):
+    average_route: TTLRoute = []
+
+    for ttl, ip_totals in enumerate(totals[most_common_length]):
+        if not ip_totals:
             average_route.append(NoResponse(ttl=ttl))
             continue
 
-        most_common_ip, num_pkts_with_ip = Counter(
-            response.ip
-            for response in ttl_responses
-            if isinstance(response, RouterResponse)
-        ).most_common(1)[0]
-
-        average_segment_time = (
-            sum(
-                response.get_segment_time()
-                for response in ttl_responses
-                if isinstance(response, RouterResponse)
-                and response.ip == most_common_ip
-            )
-            / num_pkts_with_ip
-        )
-
-        average_rtt_time = (
-            sum(
-                response.rtt_time
-                for response in ttl_responses
-                if isinstance(response, RouterResponse)
-                and response.ip == most_common_ip
-            )
-            / num_pkts_with_ip
-        )
+        # Ante empates gana la primera IP que apareció, como en Counter.most_common
+        most_common_ip = max(ip_totals, key=lambda ip: ip_totals[ip][0])
+        num_pkts_with_ip, segment_time_sum, rtt_time_sum = ip_totals[most_common_ip]
 
         average_route.append(
             RouterResponse(
                 ttl=ttl,
                 ip=most_common_ip,
-                segment_time=average_segment_time,
-                rtt_time=average_rtt_time,
+                segment_time=segment_time_sum / num_pkts_with_ip,
+                rtt_time=rtt_time_sum / num_pkts_with_ip,
             )
         )
 
@@ -110,7 +108,7 @@ def number_of_negative_ttls(route: TTLRoute) -> int:
 
 
 def get_valid_segment_times_for_ttl(
-    route_samples: RouteSamples, ttl: int
+    route_samples: Iterable[TTLRoute], ttl: int
 ) -> list[float]:
     """
     Devuelve una lista con los RTT de los paquetes que llegaron al TTL dado.
@@ -122,6 +120,24 @@ def get_valid_segment_times_for_ttl(
     ]
 
 
+def get_valid_segment_times_by_ttl(
+    route_samples: Iterable[TTLRoute], ttls: Iterable[int]
+) -> list[list[float]]:
+    """
+    Como get_valid_segment_times_for_ttl para cada TTL de ttls, pero recorriendo
+    las rutas una sola vez.
+    """
+    ttls = list(ttls)
+    segment_times: list[list[float]] = [[] for _ in ttls]
+
+    for route in route_samples:
+        for ttl, ttl_segment_times in zip(ttls, segment_times):
+            if (segment_time := route[ttl].get_segment_time()) > 0:
+                ttl_segment_times.append(segment_time)
+
+    return segment_times
+
+
 def drop_localhost(samples: RouteSamples) -> RouteSamples:
     """
     Devuelve una lista de rutas sin la primera respuesta de cada ruta, que
@@ -133,10 +149,51 @@ def drop_localhost(samples: RouteSamples) -> RouteSamples:
     return [route[1:] for route in samples]
 
 
+class RunningStats:
+    """
+    Media y varianza calculadas de a un valor por vez (algoritmo de Welford),
+    sin guardar los valores.
+    """
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    @property
+    def variance(self) -> float:
+        """Varianza muestral (con n - 1)."""
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self) -> float:
+        return float(np.sqrt(self.variance))
+
+    def confidence_interval_width(self, confidence: float = 0.95) -> float:
+        """
+        Devuelve el ancho del intervalo de confianza de la media (t de Student).
+        """
+        if self.count < 2:
+            return float("inf")
+
+        from scipy import stats
+
+        t_student_critical_value = stats.t.ppf((1 + confidence) / 2, df=self.count - 1)
+        return 2 * t_student_critical_value * self.std / np.sqrt(self.count)
+
+
 def modified_thompson_tau(n: int) -> float:
     """
     Devuelve el valor de tau de Thompson para un tamaño de muestra dado.
     """
+    from scipy import stats
+
     t_student_critical_value = stats.t.pdf(x=0.05 / 2, df=n - 2)
 
     tau = (t_student_critical_value * (n - 1)) / (
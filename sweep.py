@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Barre subredes con Echo-Requests para encontrar destinos que respondan.
+
+Reemplaza a correr nmap y copiar a mano las IPs de scanned_subnets/*.nmap: los
+hosts que responden se guardan directamente como un archivo de destinos para
+sample_destinations.py --destinations-file.
+"""
+
+import sys
+from argparse import ArgumentParser
+from dataclasses import dataclass, field
+from ipaddress import IPv4Network
+from itertools import islice
+from typing import IO, Iterable
+
+from tqdm import tqdm
+
+from probing import IPAddress, Probe, Prober, RawSocketProber
+from rate_limit import TokenBucket
+
+SWEEP_TTL = 64
+
+
+@dataclass
+class SweepResult:
+    # RTT de cada host que respondió
+    responders: dict[IPAddress, float] = field(default_factory=dict)
+    # Hosts a los que no se pudo enviar el paquete, con el error
+    skipped: dict[IPAddress, str] = field(default_factory=dict)
+
+
+def sweep(
+    networks: Iterable[IPv4Network],
+    prober: Prober,
+    *,
+    rate: float | None = 10000,
+    timeout: float = 1,
+    batch_size: int = 2**16,
+) -> SweepResult:
+    """
+    Envía un Echo-Request a cada host de las redes y retorna el RTT de los que
+    respondieron. Los hosts a los que falla el envío (por ejemplo, una dirección
+    de broadcast dentro del rango) se saltean y quedan anotados en skipped.
+
+    Los paquetes se envían sin esperar respuesta, a lo sumo rate por segundo, y
+    el prober junta las respuestas mientras tanto. Así el barrido tarda lo que
+    se tarda en enviar, más un timeout por cada tanda de batch_size hosts. Cada
+    tanda tiene su id de ICMP y el seq es la posición del host en la tanda.
+    """
+    assert batch_size <= 2**16, "No alcanzan los seq de ICMP"
+
+    bucket = TokenBucket(rate, capacity=max(1.0, rate / 100)) if rate else None
+    hosts = (str(host) for network in networks for host in network.hosts())
+    result = SweepResult()
+
+    with tqdm(desc="Barriendo hosts", unit="host") as progress:
+        while batch := list(islice(hosts, batch_size)):
+            icmp_id = prober.new_id()
+            pending = []
+            for seq, dst_ip in enumerate(batch):
+                if bucket is not None:
+                    bucket.acquire()
+                try:
+                    pending.append(
+                        prober.submit(Probe(dst_ip, SWEEP_TTL, icmp_id, seq))
+                    )
+                except OSError as e:
+                    result.skipped[dst_ip] = str(e)
+                progress.update()
+
+            for pending_probe, reply in zip(pending, prober.wait(pending, timeout)):
+                if reply is not None and reply.reached_destination:
+                    result.responders[pending_probe.probe.dst] = reply.rtt
+
+    return result
+
+
+def write_destinations(
+    destinations_file: IO[str],
+    responders: dict[IPAddress, float],
+    name: str | None = None,
+) -> None:
+    """
+    Escribe los hosts del más cercano al más lejano, como "nombre ip" si se pasa
+    un nombre (numerado, para que no se repita) o si no sólo la ip.
+    """
+    by_rtt = sorted(responders.items(), key=lambda item: item[1])
+    for i, (ip, rtt) in enumerate(by_rtt, start=1):
+        prefix = f"{name}-{i} " if name is not None else ""
+        destinations_file.write(f"{prefix}{ip}  # {rtt * 1000:.2f}ms\n")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument(
+        "networks", nargs="+", type=IPv4Network, help="Subredes, como 192.50.0.0/16"
+    )
+    parser.add_argument(
+        "--rate", type=float, default=10000, help="Paquetes por segundo (0: sin límite)"
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=1, help="Timeout para cada tanda"
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=2**16,
+        help="Cantidad máxima de paquetes en vuelo",
+    )
+    parser.add_argument(
+        "--limit",
+        type=int,
+        default=None,
+        help="Guardar sólo los hosts con menor RTT",
+    )
+    parser.add_argument(
+        "--name",
+        type=str,
+        default=None,
+        help="Nombre de los destinos (se numeran: nombre-1, nombre-2, ...)",
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default=None,
+        help="Archivo de destinos a escribir (si no, se imprimen)",
+    )
+
+    args = parser.parse_args()
+
+    with RawSocketProber() as prober:
+        result = sweep(
+            args.networks,
+            prober,
+            rate=args.rate,
+            timeout=args.timeout,
+            batch_size=args.batch_size,
+        )
+
+    responders = result.responders
+    if args.limit is not None:
+        responders = dict(
+            sorted(responders.items(), key=lambda item: item[1])[: args.limit]
+        )
+
+    for ip, error in result.skipped.items():
+        tqdm.write(f"{ip}: {error}")
+    tqdm.write(
+        f"Respondieron {len(result.responders)} hosts "
+        f"({len(result.skipped)} salteados)"
+    )
+
+    if args.output is not None:
+        with open(args.output, "w") as destinations_file:
+            write_destinations(destinations_file, responders, args.name)
+    else:
+        write_destinations(sys.stdout, responders, args.name)
@@ -0,0 +1,34 @@
+"""
+La representación por columnas de las rutas.
+"""
+
+import pytest
+
+from columnar import ColumnarSamples, drop_localhost
+from traceroute import NoResponse, RouterResponse
+
+
+def test_drop_localhost_rejects_a_missing_first_hop() -> None:
+    samples = ColumnarSamples.from_samples(
+        [
+            [
+                RouterResponse(0, "127.0.0.1", 0, 0),
+                RouterResponse(1, "127.0.0.2", 0, 0),
+            ],
+            [NoResponse(0), RouterResponse(1, "127.0.0.2", 0, 0)],
+        ]
+    )
+
+    with pytest.raises(AssertionError):
+        drop_localhost(samples)
+
+
+def test_drop_localhost() -> None:
+    samples = ColumnarSamples.from_samples(
+        [[RouterResponse(0, "127.0.0.1", 0, 0), RouterResponse(1, "10.0.0.1", 1, 1)]]
+    )
+
+    dropped = drop_localhost(samples)
+
+    assert dropped.lengths.tolist() == [1]
+    assert [dropped.ips[ip_id] for ip_id in dropped.ip_ids[0]] == ["10.0.0.1"]
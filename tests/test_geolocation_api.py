@@ -0,0 +1,170 @@
+"""
+Los clientes de geolocalización contra un servidor HTTP local que imita a
+ipgeolocation.io.
+"""
+
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from typing import Any, Iterator
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from geolocation import api
+from geolocation.api import (
+    FanoutGeolocationClient,
+    GeolocationAPIClient,
+    IPGeolocationIOClient,
+    WorldCoordinates,
+)
+from geolocation.scheduler import RequestScheduler
+
+IPS = ["192.0.2.1", "192.0.2.2", "198.51.100.1", "203.0.113.1"]
+
+
+def location_of(ip: str) -> dict[str, Any]:
+    return {"ip": ip, "latitude": str(int(ip.split(".")[-1])), "longitude": "10"}
+
+
+class StubServer(ThreadingHTTPServer):
+    bulk_status = 200
+
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.requests: list[tuple[str, int]] = []
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    server: StubServer
+
+    def reply(self, status: int, body: Any) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self) -> None:
+        self.server.requests.append(("GET", 1))
+        ip = parse_qs(urlparse(self.path).query)["ip"][0]
+        self.reply(200, location_of(ip))
+
+    def do_POST(self) -> None:
+        length = int(self.headers["Content-Length"])
+        ips = json.loads(self.rfile.read(length))["ips"]
+        self.server.requests.append(("POST", len(ips)))
+        if self.server.bulk_status != 200:
+            self.reply(self.server.bulk_status, {"message": "Sólo planes pagos"})
+        else:
+            self.reply(200, [location_of(ip) for ip in ips])
+
+    def log_message(self, *_: Any) -> None:
+        pass
+
+
+class StubClient(IPGeolocationIOClient):
+    name = "stub"
+    daily_quota: int | None = None
+    monthly_quota: int | None = None
+    requests_per_second = 1000
+
+    def __init__(self, url: str) -> None:
+        super().__init__(api_key="test")
+        self.url = url
+
+    def get_url(self, ip: str) -> str:
+        return f"{self.url}/ipgeo?ip={ip}"
+
+    def get_bulk_url(self) -> str | None:
+        return f"{self.url}/ipgeo-bulk"
+
+
+@pytest.fixture
+def server(tmp_path: Any, monkeypatch: pytest.MonkeyPatch) -> Iterator[StubServer]:
+    monkeypatch.setattr(api, "CACHE_DIRECTORY", tmp_path)
+    monkeypatch.setattr(RequestScheduler, "schedulers", {})
+    stub = StubServer()
+    thread = Thread(target=stub.serve_forever, daemon=True)
+    thread.start()
+    yield stub
+    stub.shutdown()
+    stub.server_close()
+
+
+def stub_client(server: StubServer) -> StubClient:
+    host, port = server.server_address[:2]
+    return StubClient(f"http://{host!s}:{port}")
+
+
+def test_bulk_endpoint_resolves_all_ips_in_one_request(server: StubServer) -> None:
+    locations = stub_client(server).get_ip_locations(IPS + IPS[:2])
+
+    assert server.requests == [("POST", len(IPS))]
+    assert locations["203.0.113.1"] == WorldCoordinates(1, 10)
+    assert list(locations) == IPS
+
+
+def test_cached_ips_are_not_requested_again(server: StubServer) -> None:
+    client = stub_client(server)
+    client.get_ip_locations(IPS[:2])
+    client.get_ip_locations(IPS)
+
+    assert server.requests == [("POST", 2), ("POST", 2)]
+
+
+@pytest.mark.parametrize("status", [401, 403])
+def test_rejected_bulk_endpoint_falls_back_to_single_requests(
+    server: StubServer, status: int
+) -> None:
+    server.bulk_status = status
+    client = stub_client(server)
+
+    locations = client.get_ip_locations(IPS)
+
+    assert len(locations) == len(IPS)
+    assert server.requests == [("POST", len(IPS))] + [("GET", 1)] * len(IPS)
+
+    # No se vuelve a intentar el endpoint bulk
+    client.get_ip_locations(["192.0.2.3"])
+    assert server.requests[-1] == ("GET", 1)
+
+
+def test_rejected_bulk_requests_do_not_use_quota(server: StubServer) -> None:
+    server.bulk_status = 401
+    client = stub_client(server)
+    client.daily_quota = 100
+
+    client.get_ip_locations(IPS)
+
+    quota = client.scheduler.quota
+    assert quota is not None
+    assert quota.used()["day"] == len(IPS)
+
+
+def test_other_bulk_errors_are_raised(server: StubServer) -> None:
+    import requests
+
+    server.bulk_status = 400
+
+    with pytest.raises(requests.HTTPError):
+        stub_client(server).get_ip_locations(IPS)
+
+
+class FixedClient(GeolocationAPIClient):
+    name = "fixed"
+
+    def get_ip_location(self, ip: str) -> WorldCoordinates:
+        return WorldCoordinates(1, 2)
+
+
+def test_fanout_writes_to_the_shared_cache(server: StubServer) -> None:
+    with FanoutGeolocationClient(["fixed"]) as client:
+        assert client.get_ip_locations(IPS) == dict.fromkeys(
+            IPS, WorldCoordinates(1, 2)
+        )
+
+    assert client.executor._shutdown
+    cache = IPGeolocationIOClient(api_key="test").cache
+    assert cache.get_many(IPS) == dict.fromkeys(IPS, WorldCoordinates(1, 2))
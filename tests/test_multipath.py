@@ -0,0 +1,23 @@
+"""
+Descubrimiento de caminos balanceados sobre una red simulada.
+"""
+
+import pytest
+
+from multipath import discover_multipath
+from simulation import SimulatedProber, random_network
+
+
+@pytest.mark.parametrize("seed", range(8))
+def test_edges_join_consecutive_ttls(seed: int) -> None:
+    network, dst_ips = random_network(
+        4, hops=10, load_balanced_hops=4, width=4, silent_rate=0.1, seed=seed
+    )
+
+    with SimulatedProber(network) as prober:
+        for dst_ip in dst_ips:
+            dag = discover_multipath(dst_ip, prober, max_ttl=14)
+
+            assert dag.edges
+            for (ttl, _), (next_ttl, _) in dag.edges:
+                assert next_ttl == ttl + 1
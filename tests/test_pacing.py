@@ -0,0 +1,23 @@
+"""
+Pacing por salto sobre una red simulada.
+"""
+
+from pacing import PacedProber
+from probing import Probe
+from simulation import SimulatedProber, random_network
+
+
+def test_replies_count_for_the_hop_the_probes_were_paced_as() -> None:
+    network, (dst_ip,) = random_network(1, hops=6, load_balanced_hops=0)
+
+    with PacedProber(SimulatedProber(network), per_hop_rate=1000, burst=8) as prober:
+        prober.probe_many([Probe(dst_ip, 4, prober.new_id(), i) for i in range(5)], 1)
+
+        # Todavía no se sabía qué router estaba en el TTL 4
+        assert list(prober.hops) == [(dst_ip, 4)]
+        assert prober.hops[(dst_ip, 4)].response_rate == 1
+
+        prober.probe_many([Probe(dst_ip, 4, prober.new_id(), i) for i in range(5)], 1)
+
+        router = prober.last_hop[(dst_ip, 4)]
+        assert prober.hops[router].response_rate == 1
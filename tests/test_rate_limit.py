@@ -0,0 +1,11 @@
+import pytest
+
+from rate_limit import TokenBucket
+
+
+def test_acquire_more_than_capacity_fails() -> None:
+    bucket = TokenBucket(rate=1000, capacity=4)
+
+    bucket.acquire(4)
+    with pytest.raises(ValueError):
+        bucket.acquire(5)
@@ -0,0 +1,45 @@
+"""
+Lectura y escritura de los archivos de samples.
+"""
+
+import pickle
+from pathlib import Path
+
+from traceroute import (
+    NoResponse,
+    RouterResponse,
+    SampleWriter,
+    TTLRoute,
+    load_samples,
+    save_samples,
+)
+
+ROUTES: list[TTLRoute] = [
+    [RouterResponse(1, "10.0.0.1", 0.001, 0.001), NoResponse(2)],
+    [
+        RouterResponse(1, "10.0.0.1", 0.002, 0.002),
+        RouterResponse(2, "10.0.0.2", 0.003, 0.005),
+    ],
+]
+
+
+def test_append_to_json_lines(tmp_path: Path) -> None:
+    path = str(tmp_path / "routes.samples")
+    save_samples(ROUTES[:1], path)
+
+    with SampleWriter(path, append=True) as writer:
+        writer.write(ROUTES[1])
+
+    assert load_samples(path) == ROUTES
+
+
+def test_append_to_legacy_pickle(tmp_path: Path) -> None:
+    path = str(tmp_path / "routes.samples")
+    with open(path, "wb") as samples_file:
+        pickle.dump(ROUTES[:1], samples_file)
+
+    with SampleWriter(path, append=True) as writer:
+        writer.write(ROUTES[1])
+        writer.write(ROUTES[0])
+
+    assert load_samples(path) == ROUTES + ROUTES[:1]
@@ -0,0 +1,60 @@
+"""
+Muestreo adaptativo y re-medición de TTLs sobre una red simulada.
+"""
+
+from sampling import fill_missing_hops
+from simulation import SimulatedNetwork, SimulatedProber
+from traceroute import NoResponse, RouteResponse, RouterResponse
+
+DST_IP = "198.18.0.1"
+
+
+def hop(ttl: int, ip: str) -> RouterResponse:
+    return RouterResponse(ttl=ttl, ip=ip, segment_time=0.001, rtt_time=0.001 * ttl)
+
+
+def ip_of(response: RouteResponse) -> str | None:
+    return response.ip if isinstance(response, RouterResponse) else None
+
+
+def test_route_ends_where_the_destination_replies() -> None:
+    # El destino ahora está a 3 saltos, pero las muestras lo vieron a 5
+    network = SimulatedNetwork()
+    network.add_route(DST_IP, ["10.0.0.1", "10.0.0.2", DST_IP], jitter=0)
+    samples = [
+        [
+            hop(0, "127.0.0.1"),
+            hop(1, "10.0.0.1"),
+            hop(2, "10.0.0.2"),
+            NoResponse(3),
+            NoResponse(4),
+            hop(5, DST_IP),
+        ],
+        [
+            hop(0, "127.0.0.1"),
+            hop(1, "10.0.0.1"),
+            hop(2, "10.0.0.2"),
+            hop(3, "10.0.0.3"),
+            NoResponse(4),
+            hop(5, DST_IP),
+        ],
+    ]
+
+    with SimulatedProber(network) as prober:
+        filled = fill_missing_hops(DST_IP, samples, budget_per_ttl=1, prober=prober)
+
+    # La primera ruta termina en el TTL 3, y la respuesta del TTL 4 es para la
+    # segunda, que también termina ahí
+    assert [ip_of(response) for response in filled[0]] == [
+        "127.0.0.1",
+        "10.0.0.1",
+        "10.0.0.2",
+        DST_IP,
+    ]
+    assert [ip_of(response) for response in filled[1]] == [
+        "127.0.0.1",
+        "10.0.0.1",
+        "10.0.0.2",
+        "10.0.0.3",
+        DST_IP,
+    ]
@@ -1,35 +1,86 @@
+import json
 import pickle
+import random
+import sys
 from abc import ABC, abstractmethod
 from argparse import ArgumentParser, Namespace
+from contextlib import nullcontext
 from dataclasses import dataclass
+from functools import cache
+from itertools import count
 from pprint import pprint
-from time import time
-from typing import Any, Callable, TypeVar
+from time import perf_counter_ns
+from typing import IO, Any, Callable, Iterable, Iterator, Mapping, TypeVar
 
-from scapy.layers.inet import ICMP, IP
-from scapy.sendrecv import sr1
 from tqdm import tqdm
 
+import metrics
+from probing import IPAddress, Probe, Prober, RawSocketProber
+
 SAMPLES_PER_TTL = 2**5
 MAX_TTL = 2**6
 
-IPAddress = str
-
 
 T = TypeVar("T")
 
+PROBES_SENT = metrics.counter("traceroute_probes_sent_total", "Echo-Requests enviados")
+REPLIES = metrics.counter("traceroute_replies_total", "Respuestas recibidas por TTL")
+TIMEOUTS = metrics.counter("traceroute_timeouts_total", "Echo-Requests sin respuesta")
+RTT_SECONDS = metrics.histogram("traceroute_rtt_seconds", "RTT de las respuestas")
+SEND_SECONDS = metrics.histogram(
+    "traceroute_send_seconds",
+    "Tiempo en enviar y esperar cada tanda de paquetes (dentro de scapy o del prober)",
+)
+TRACES = metrics.counter("traceroute_traces_total", "Trazas, según si llegaron")
+TRACE_SECONDS = metrics.histogram("traceroute_trace_seconds", "Duración de cada traza")
+SAMPLING_SECONDS = metrics.histogram(
+    "traceroute_sample_routes_seconds", "Duración de cada sample_routes"
+)
+
 
 def timeit(f: Callable[[], T]) -> tuple[T, float]:
-    start_time = time()
+    start_time = perf_counter_ns()
     ret = f()
-    end_time = time()
-    return (ret, end_time - start_time)
-
-
+    end_time = perf_counter_ns()
+    return (ret, (end_time - start_time) / 1e9)
+
+
+def record_replies(
+    backend: str, ttls: Iterable[int], replies: Mapping[int, tuple[IPAddress, float]]
+) -> None:
+    """Anota en las métricas los paquetes enviados y sus respuestas, por TTL."""
+    for ttl in ttls:
+        PROBES_SENT.inc(backend=backend)
+        if ttl in replies:
+            REPLIES.inc(ttl=ttl)
+            RTT_SECONDS.observe(replies[ttl][1], backend=backend)
+        else:
+            TIMEOUTS.inc(ttl=ttl)
+
+
+# Las respuestas usan __slots__ en vez de __dict__ porque una campaña larga tiene
+# millones de ellas, y las IPs se internan para que todas las respuestas de un
+# mismo router compartan el mismo string.
 @dataclass(frozen=True)
 class RouteResponse(ABC):
+    __slots__ = ("ttl",)
+
     ttl: int
 
+    def __getstate__(self) -> dict[str, Any]:
+        return {
+            slot: getattr(self, slot)
+            for cls in type(self).__mro__
+            for slot in getattr(cls, "__slots__", ())
+        }
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        # Los samples viejos se picklearon con el __dict__, que tiene la misma forma
+        for name, value in state.items():
+            if isinstance(value, str):
+                value = sys.intern(value)
+            object.__setattr__(self, name, value)
+
     @abstractmethod
     def get_segment_time(self) -> float:
         pass
@@ -48,6 +99,8 @@ class RouteResponse(ABC):
 
 
 class NoResponse(RouteResponse):
+    __slots__ = ()
+
     def get_segment_time(self) -> float:
         return 0
 
@@ -63,10 +116,15 @@ class NoResponse(RouteResponse):
 
 @dataclass(frozen=True)
 class RouterResponse(RouteResponse):
+    __slots__ = ("ip", "segment_time", "rtt_time")
+
     ip: str
     segment_time: float
     rtt_time: float
 
+    def __post_init__(self) -> None:
+        object.__setattr__(self, "ip", sys.intern(self.ip))
+
     def __repr__(self) -> str:
         # Lo comento porque me tira excepción
         # domain = getnameinfo((self.ip, 0), 0)[0]
@@ -86,23 +144,130 @@ class RouterResponse(RouteResponse):
 TTLRoute = list[RouteResponse]
 
 
-def echo_request(dst_ip: IPAddress, ttl: int, timeout: float) -> tuple[Any, float]:
-    """Envía un Echo-Request y mide el RTT en ms"""
+def packet_rtt(sent: Any, received: Any, fallback: float) -> float:
+    """
+    Calcula el RTT con las marcas de tiempo de los paquetes.
+
+    scapy anota en sent_time el momento justo antes de enviar el paquete, y en
+    time el momento en que el kernel recibió la respuesta (SO_TIMESTAMPNS), así
+    que el RTT no incluye armar el paquete ni levantar el sniffer. Si falta
+    alguna de las dos marcas se usa fallback.
+    """
+    sent_time = getattr(sent, "sent_time", None)
+    received_time = getattr(received, "time", None)
+
+    if not sent_time or not received_time or received_time < sent_time:
+        return fallback
+
+    return float(received_time - sent_time)
+
+
+def echo_request(
+    dst_ip: IPAddress,
+    ttl: int,
+    timeout: float,
+    prober: Prober | None = None,
+) -> tuple[Any, float]:
+    """
+    Envía un Echo-Request y mide el RTT en segundos
+
+    Si se pasa un prober se usa su socket, y si no se usa sr1 de scapy. En los
+    dos casos la respuesta tiene el atributo src.
+    """
+    if prober is not None:
+        with SEND_SECONDS.time(backend="prober"):
+            reply = prober.probe(Probe(dst_ip, ttl, prober.new_id(), ttl), timeout)
+        rtt = timeout if reply is None else reply.rtt
+        record_replies("prober", [ttl], {ttl: (reply.src, rtt)} if reply else {})
+        return (reply, rtt)
+
+    # scapy tarda en importarse, y leer o analizar muestras no lo necesita
+    from scapy.layers.inet import ICMP, IP
+    from scapy.sendrecv import sr1
+
     probe = IP(dst=dst_ip, ttl=ttl) / ICMP()
-    return timeit(lambda: sr1(probe, verbose=False, timeout=1))
+    res, elapsed = timeit(lambda: sr1(probe, verbose=False, timeout=timeout))
+    SEND_SECONDS.observe(elapsed, backend="scapy")
+    rtt = packet_rtt(probe, res, fallback=elapsed)
+    record_replies("scapy", [ttl], {ttl: (res.src, rtt)} if res is not None else {})
+    return (res, rtt)
 
 
-def traceroute(
-    dst_ip: IPAddress, max_ttl: int = MAX_TTL, timeout: float = 1
+# Ids de ICMP para los envíos con scapy: uno nuevo en cada llamada, como hace
+# Prober.new_id, para que una respuesta tardía de la traza anterior no se
+# confunda con un paquete de la siguiente
+_scapy_ids = count(random.randrange(2**16))
+
+
+def parallel_echo_requests(
+    dst_ip: IPAddress,
+    ttls: Iterable[int],
+    timeout: float,
+    prober: Prober | None = None,
+) -> dict[int, tuple[IPAddress, float]]:
+    """
+    Envía en simultáneo un Echo-Request por cada TTL en ttls.
+
+    Retorna un diccionario TTL -> (IP que respondió, RTT). Los TTLs que no
+    respondieron no aparecen. Cada llamada usa un id de ICMP nuevo y el seq es el
+    TTL, así scapy puede asociar cada respuesta (Echo-Reply o Time-Exceeded) con
+    el paquete que la generó.
+    """
+    ttls = list(ttls)
+
+    if prober is not None:
+        icmp_id = prober.new_id()
+        with SEND_SECONDS.time(backend="prober"):
+            replies = prober.probe_many(
+                [Probe(dst_ip, ttl, icmp_id, ttl) for ttl in ttls], timeout
+            )
+        prober_replies = {
+            ttl: (reply.src, reply.rtt)
+            for ttl, reply in zip(ttls, replies)
+            if reply is not None
+        }
+        record_replies("prober", ttls, prober_replies)
+        return prober_replies
+
+    from scapy.layers.inet import ICMP, IP
+    from scapy.sendrecv import sr
+
+    icmp_id = next(_scapy_ids) % 2**16
+    probes = [IP(dst=dst_ip, ttl=ttl) / ICMP(id=icmp_id, seq=ttl) for ttl in ttls]
+    with SEND_SECONDS.time(backend="scapy"):
+        answered, _ = sr(probes, verbose=False, timeout=timeout)
+
+    scapy_replies = {
+        sent[IP].ttl: (received.src, received.time - sent.sent_time)
+        for sent, received in answered
+    }
+    record_replies("scapy", ttls, scapy_replies)
+    return scapy_replies
+
+
+@cache
+def local_ip() -> IPAddress:
+    """La IP de origen que usa scapy, que es la del primer salto de cada ruta."""
+    from scapy.layers.inet import IP
+
+    return IP().src
+
+
+def route_from_replies(
+    dst_ip: IPAddress, replies: Iterable[tuple[int, IPAddress | None, float]]
 ) -> TTLRoute:
-    """Retorna una lista de RouteResponse con los TTLs de la ruta al destino"""
-    route: TTLRoute = [RouterResponse(ttl=0, ip=IP().src, segment_time=0, rtt_time=0)]
-    last_rtt = 0.0
+    """
+    Arma la ruta a partir de las respuestas (ttl, ip, rtt) ordenadas por TTL.
 
-    for ttl in tqdm(range(1, max_ttl + 1), desc="Midiendo TTLs"):
-        res, rtt = echo_request(dst_ip, ttl, timeout=timeout)
+    Un ip None significa que no hubo respuesta para ese TTL. Se deja de consumir
+    replies al llegar al destino, así que puede ser un generador que envía los
+    paquetes a medida que se los pide.
+    """
+    route: TTLRoute = [RouterResponse(ttl=0, ip=local_ip(), segment_time=0, rtt_time=0)]
+    last_rtt = 0.0
 
-        if res is None:
+    for ttl, ip, rtt in replies:
+        if ip is None:
             route.append(NoResponse(ttl=ttl))
             continue
 
@@ -117,18 +282,111 @@ def traceroute(
             last_rtt = rtt
 
         route.append(
-            RouterResponse(ttl=ttl, ip=res.src, segment_time=rtt_diff, rtt_time=rtt)
+            RouterResponse(ttl=ttl, ip=ip, segment_time=rtt_diff, rtt_time=rtt)
         )
 
         # llegamos al destino
-        if res.src == dst_ip:
+        if ip == dst_ip:
             return route
 
     raise Exception("No se llegó al destino")
 
 
+def traceroute(
+    dst_ip: IPAddress,
+    max_ttl: int = MAX_TTL,
+    timeout: float = 1,
+    parallel: bool = False,
+    prober: Prober | None = None,
+) -> TTLRoute:
+    """
+    Retorna una lista de RouteResponse con los TTLs de la ruta al destino
+
+    Si parallel es True, se envían los paquetes de todos los TTLs a la vez, por
+    lo que la ruta tarda un solo timeout en vez de uno por cada TTL sin respuesta.
+    Si se pasa un prober, todos los paquetes salen por su socket.
+    """
+
+    def parallel_replies() -> Iterator[tuple[int, IPAddress | None, float]]:
+        responses = parallel_echo_requests(
+            dst_ip, range(1, max_ttl + 1), timeout, prober=prober
+        )
+        for ttl in range(1, max_ttl + 1):
+            yield (ttl, *responses.get(ttl, (None, 0.0)))
+
+    def sequential_replies() -> Iterator[tuple[int, IPAddress | None, float]]:
+        for ttl in tqdm(range(1, max_ttl + 1), desc="Midiendo TTLs"):
+            res, rtt = echo_request(dst_ip, ttl, timeout=timeout, prober=prober)
+            yield (ttl, None if res is None else res.src, rtt)
+
+    with TRACE_SECONDS.time(parallel=parallel):
+        try:
+            route = route_from_replies(
+                dst_ip, parallel_replies() if parallel else sequential_replies()
+            )
+        except Exception:
+            TRACES.inc(reached=False)
+            raise
+
+    TRACES.inc(reached=True)
+    return route
+
+
 RouteSamples = list[TTLRoute]
 
+# Las muestras se guardan en JSON Lines: una ruta por línea, y cada ruta es una
+# lista de respuestas. NoResponse se guarda como [ttl] y RouterResponse como
+# [ttl, ip, segment_time, rtt_time]. Los archivos viejos son un pickle de
+# RouteSamples, y se distinguen por el primer byte.
+PICKLE_MAGIC = pickle.PROTO
+
+
+def route_to_record(route: TTLRoute) -> list[list[Any]]:
+    return [
+        (
+            [response.ttl, response.ip, response.segment_time, response.rtt_time]
+            if isinstance(response, RouterResponse)
+            else [response.ttl]
+        )
+        for response in route
+    ]
+
+
+def route_from_record(record: list[list[Any]]) -> TTLRoute:
+    return [
+        (
+            RouterResponse(ttl=hop[0], ip=hop[1], segment_time=hop[2], rtt_time=hop[3])
+            if len(hop) > 1
+            else NoResponse(ttl=hop[0])
+        )
+        for hop in record
+    ]
+
+
+class SampleWriter:
+    """
+    Guarda las rutas en el archivo a medida que se van completando.
+
+    Cada ruta se escribe en su propia línea y se hace flush, así que si el
+    proceso se corta se pierde como mucho la ruta que se estaba midiendo.
+    """
+
+    def __init__(self, path: str, append: bool = False) -> None:
+        self.file: IO[str] = open(path, "a" if append else "w")
+
+    def write(self, route: TTLRoute) -> None:
+        self.file.write(json.dumps(route_to_record(route)) + "\n")
+        self.file.flush()
+
+    def close(self) -> None:
+        self.file.close()
+
+    def __enter__(self) -> "SampleWriter":
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        self.close()
+
 
 def sample_routes(
     dst_ip: IPAddress,
@@ -136,6 +394,9 @@ def sample_routes(
     samples_per_ttl: int = SAMPLES_PER_TTL,
     max_ttl: int = MAX_TTL,
     timeout: float = 1,
+    parallel: bool = False,
+    output: SampleWriter | None = None,
+    prober: Prober | None = None,
 ) -> RouteSamples:
     """
     Retorna una lista de presuntas rutas por la cual viajó el paquete de ping.
@@ -143,13 +404,200 @@ def sample_routes(
     Cada ruta tiene un objecto RouteResponse por valor de TTL:
     - NoResponse si se cortó por timeout
     - RouterResponse si respondieron con TTLTimeExceeded
+
+    Si se pasa un output, cada ruta se guarda ahí apenas termina de medirse.
+    """
+    return list(
+        iter_routes(
+            dst_ip,
+            samples_per_ttl=samples_per_ttl,
+            max_ttl=max_ttl,
+            timeout=timeout,
+            parallel=parallel,
+            output=output,
+            prober=prober,
+        )
+    )
+
+
+def iter_routes(
+    dst_ip: IPAddress,
+    *,
+    samples_per_ttl: int = SAMPLES_PER_TTL,
+    max_ttl: int = MAX_TTL,
+    timeout: float = 1,
+    parallel: bool = False,
+    output: SampleWriter | None = None,
+    prober: Prober | None = None,
+) -> Iterator[TTLRoute]:
+    """
+    Como sample_routes, pero devuelve las rutas de a una a medida que se miden,
+    sin guardarlas en memoria.
+    """
+    with SAMPLING_SECONDS.time():
+        for _ in tqdm(range(samples_per_ttl), desc="Midiendo rutas"):
+            route = traceroute(
+                dst_ip,
+                max_ttl=max_ttl,
+                timeout=timeout,
+                parallel=parallel,
+                prober=prober,
+            )
+            if output is not None:
+                output.write(route)
+            yield route
+
+
+def sample_many_routes(
+    dst_ips: Iterable[IPAddress],
+    *,
+    samples_per_ttl: int = SAMPLES_PER_TTL,
+    max_ttl: int = MAX_TTL,
+    timeout: float = 1,
+    batch_size: int = 2**12,
+    outputs: Mapping[IPAddress, SampleWriter] = {},
+    prober: Prober | None = None,
+) -> dict[IPAddress, RouteSamples]:
+    """
+    Como sample_routes, pero para muchos destinos a la vez desde un solo proceso.
+
+    En cada ronda se envía una traza de todos los destinos con un único sr (un
+    socket y un sniffer), en tandas de a lo sumo batch_size paquetes. Cada
+    destino tiene su propio id de ICMP y el seq es el TTL, así que las respuestas
+    se demultiplexan por (id, seq). Las trazas que no llegan al destino se
+    descartan. Las rutas de los destinos que estén en outputs se guardan al
+    terminar cada ronda.
+    """
+    dst_ips = list(dict.fromkeys(dst_ips))
+    routes: dict[IPAddress, RouteSamples] = {dst_ip: [] for dst_ip in dst_ips}
+
+    for dst_ip, route in iter_many_routes(
+        dst_ips,
+        samples_per_ttl=samples_per_ttl,
+        max_ttl=max_ttl,
+        timeout=timeout,
+        batch_size=batch_size,
+        outputs=outputs,
+        prober=prober,
+    ):
+        routes[dst_ip].append(route)
+
+    return routes
+
+
+def iter_many_routes(
+    dst_ips: Iterable[IPAddress],
+    *,
+    samples_per_ttl: int = SAMPLES_PER_TTL,
+    max_ttl: int = MAX_TTL,
+    timeout: float = 1,
+    batch_size: int = 2**12,
+    outputs: Mapping[IPAddress, SampleWriter] = {},
+    prober: Prober | None = None,
+) -> Iterator[tuple[IPAddress, TTLRoute]]:
     """
-    routes = []
+    Como sample_many_routes, pero devuelve los pares (destino, ruta) a medida que
+    se miden, sin guardarlos en memoria.
+    """
+    dst_ips = list(dict.fromkeys(dst_ips))
+    assert len(dst_ips) < 2**16, "No alcanzan los ids de ICMP"
+
+    destinations_per_batch = max(1, batch_size // max_ttl)
+
+    # Ids nuevos en cada ronda (como hace el prober con new_id), para que una
+    # respuesta tardía de una ronda no se confunda con una de la siguiente
+    round_first_ids = count(random.randrange(2**16), len(dst_ips))
 
     for _ in tqdm(range(samples_per_ttl), desc="Midiendo rutas"):
-        routes.append(traceroute(dst_ip, max_ttl=max_ttl, timeout=timeout))
+        round_first_id = next(round_first_ids)
+        for start in range(0, len(dst_ips), destinations_per_batch):
+            batch = dst_ips[start : start + destinations_per_batch]
+            replies = multi_destination_echo_requests(
+                {dst_ip: range(1, max_ttl + 1) for dst_ip in batch},
+                first_id=(round_first_id + start) % 2**16,
+                timeout=timeout,
+                prober=prober,
+            )
+
+            for dst_ip in batch:
+                try:
+                    route = route_from_replies(
+                        dst_ip,
+                        (
+                            (ttl, *replies[dst_ip].get(ttl, (None, 0.0)))
+                            for ttl in range(1, max_ttl + 1)
+                        ),
+                    )
+                except Exception as e:
+                    tqdm.write(f"{dst_ip}: {e}")
+                    continue
+                if dst_ip in outputs:
+                    outputs[dst_ip].write(route)
+                yield (dst_ip, route)
+
+
+def multi_destination_echo_requests(
+    ttls: Mapping[IPAddress, Iterable[int]],
+    *,
+    first_id: int,
+    timeout: float,
+    prober: Prober | None = None,
+) -> dict[IPAddress, dict[int, tuple[IPAddress, float]]]:
+    """
+    Envía un Echo-Request por cada destino de ttls y cada uno de sus TTLs, en un
+    único sr (o por el socket del prober, si se pasa uno).
 
-    return routes
+    El destino i usa el id de ICMP first_id + i (módulo 2^16). Retorna, para cada
+    destino, un diccionario TTL -> (IP que respondió, RTT) como
+    parallel_echo_requests.
+    """
+    ttls = {dst_ip: list(dst_ttls) for dst_ip, dst_ttls in ttls.items()}
+
+    if prober is not None:
+        # Ids nuevos en cada ronda, para no confundir respuestas tardías
+        icmp_ids = {dst_ip: prober.new_id() for dst_ip in ttls}
+        icmp_probes = [
+            Probe(dst_ip, ttl, icmp_ids[dst_ip], ttl)
+            for dst_ip, dst_ttls in ttls.items()
+            for ttl in dst_ttls
+        ]
+        prober_replies: dict[IPAddress, dict[int, tuple[IPAddress, float]]] = {
+            dst_ip: {} for dst_ip in ttls
+        }
+        with SEND_SECONDS.time(backend="prober"):
+            replies = prober.probe_many(icmp_probes, timeout)
+        for probe, reply in zip(icmp_probes, replies):
+            if reply is not None:
+                prober_replies[probe.dst][probe.ttl] = (reply.src, reply.rtt)
+        for dst_ip, dst_ttls in ttls.items():
+            record_replies("prober", dst_ttls, prober_replies[dst_ip])
+        return prober_replies
+
+    from scapy.layers.inet import ICMP, IP
+    from scapy.sendrecv import sr
+
+    probe_owner = {(first_id + i) % 2**16: dst_ip for i, dst_ip in enumerate(ttls)}
+    probes = [
+        IP(dst=dst_ip, ttl=ttl) / ICMP(id=icmp_id, seq=ttl)
+        for icmp_id, dst_ip in probe_owner.items()
+        for ttl in ttls[dst_ip]
+    ]
+    with SEND_SECONDS.time(backend="scapy"):
+        answered, _ = sr(probes, verbose=False, timeout=timeout)
+
+    scapy_replies: dict[IPAddress, dict[int, tuple[IPAddress, float]]] = {
+        dst_ip: {} for dst_ip in ttls
+    }
+    for sent, received in answered:
+        dst_ip = probe_owner[sent[ICMP].id]
+        scapy_replies[dst_ip][sent[ICMP].seq] = (
+            received.src,
+            received.time - sent.sent_time,
+        )
+    for dst_ip, dst_ttls in ttls.items():
+        record_replies("scapy", dst_ttls, scapy_replies[dst_ip])
+
+    return scapy_replies
 
 
 traceroute_parser = ArgumentParser()
@@ -163,20 +611,113 @@ traceroute_parser.add_argument(
 traceroute_parser.add_argument(
     "--timeout", type=float, default=1, help="Timeout para cada paquete"
 )
+traceroute_parser.add_argument(
+    "--parallel",
+    action="store_true",
+    default=False,
+    help="Enviar los paquetes de todos los TTLs a la vez",
+)
+traceroute_parser.add_argument(
+    "--raw-socket",
+    action="store_true",
+    default=False,
+    help="Enviar todos los paquetes por un único socket raw en vez de usar scapy",
+)
+traceroute_parser.add_argument(
+    "--per-hop-rate",
+    type=float,
+    default=None,
+    help="Paquetes por segundo a cada salto (con --raw-socket)",
+)
+metrics.add_instrumentation_arguments(traceroute_parser)
 
 
-def sample_route_from_args(args: Namespace) -> RouteSamples:
-    return sample_routes(
-        args.ip,
-        samples_per_ttl=args.samples,
-        max_ttl=args.max_ttl,
-        timeout=args.timeout,
-    )
+def prober_from_args(args: Namespace) -> Prober | None:
+    """
+    El prober que piden los argumentos: ninguno (scapy), un socket raw, o un
+    socket raw con pacing por salto.
+    """
+    if not args.raw_socket:
+        return None
+
+    prober: Prober = RawSocketProber()
+    if args.per_hop_rate is not None:
+        from pacing import PacedProber
+
+        prober = PacedProber(prober, per_hop_rate=args.per_hop_rate)
+    return prober
+
+
+def sample_route_from_args(
+    args: Namespace, output: SampleWriter | None = None
+) -> RouteSamples:
+    return list(iter_routes_from_args(args, output))
+
+
+def iter_routes_from_args(
+    args: Namespace, output: SampleWriter | None = None
+) -> Iterator[TTLRoute]:
+    with prober_from_args(args) or nullcontext() as prober:
+        yield from iter_routes(
+            args.ip,
+            samples_per_ttl=args.samples,
+            max_ttl=args.max_ttl,
+            timeout=args.timeout,
+            parallel=args.parallel,
+            output=output,
+            prober=prober,
+        )
+
+
+def save_samples(samples: Iterable[TTLRoute], path: str) -> None:
+    with SampleWriter(path) as writer:
+        for route in samples:
+            writer.write(route)
+
+
+class _SamplesUnpickler(pickle.Unpickler):
+    """
+    Los samples viejos se generaron corriendo traceroute.py como script, así que
+    referencian las clases como __main__.RouterResponse.
+    """
+
+    def find_class(self, module: str, name: str) -> Any:
+        if module == "__main__" and name in ("RouterResponse", "NoResponse"):
+            return globals()[name]
+        return super().find_class(module, name)
+
+
+def iter_samples(path: str) -> Iterator[TTLRoute]:
+    """
+    Lee las rutas de un archivo de a una, sin cargarlo entero en memoria.
+
+    Los archivos en el formato viejo (pickle) sí se cargan enteros, y se siguen
+    leyendo las rutas que se les hayan agregado después como JSON Lines.
+    """
+    with open(path, "rb") as samples_file:
+        if samples_file.peek(1)[:1] == PICKLE_MAGIC:
+            yield from _SamplesUnpickler(samples_file).load()
+
+        for line in samples_file:
+            if line.strip():
+                yield route_from_record(json.loads(line))
 
 
 def load_samples(path: str) -> RouteSamples:
-    with open(path, "rb") as pkl:
-        return pickle.load(pkl)
+    return list(iter_samples(path))
+
+
+class SamplesFile:
+    """
+    Las rutas de un archivo, que se leen de nuevo cada vez que se recorren. Sirve
+    para los análisis que necesitan más de una pasada sin cargar todo en memoria.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    def __iter__(self) -> Iterator[TTLRoute]:
+        return iter_samples(self.path)
 
 
 if __name__ == "__main__":
@@ -186,12 +727,20 @@ if __name__ == "__main__":
         default=None,
         help="Path a donde guardar los samples",
     )
+    traceroute_parser.add_argument(
+        "--append",
+        action="store_true",
+        default=False,
+        help="Agregar los samples al final de --output en vez de reemplazarlo",
+    )
 
     args = traceroute_parser.parse_args()
-    samples = sample_route_from_args(args)
-
-    if args.output is not None:
-        with open(args.output, "wb") as pkl:
-            pickle.dump(samples, pkl, pickle.HIGHEST_PROTOCOL)
 
-    pprint(samples)
+    with metrics.instrumented(args.metrics, args.profile):
+        if args.output is not None:
+            # Las rutas sólo se guardan en el archivo, no en memoria
+            with SampleWriter(args.output, append=args.append) as writer:
+                saved = sum(1 for _ in iter_routes_from_args(args, output=writer))
+            print(f"Se guardaron {saved} rutas en {args.output}")
+        else:
+            pprint(sample_route_from_args(args))